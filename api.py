@@ -0,0 +1,253 @@
+"""API HTTP/JSON locale, en lecture seule, sur les données chargées dans le tableau de bord.
+
+D'autres outils peuvent ainsi obtenir les chiffres affichés sans passer
+par l'interface. Les réponses sont calculées sur les DataFrames du
+magasin partagé (``cache.shared_store``), à défaut sur leurs instantanés
+Feather : aucun classeur n'est relu. Seuls les fichiers ouverts dans
+l'application depuis le démarrage du processus sont servis.
+
+L'API est démarrée par l'application quand ``DASHBOARD_API_PORT`` est
+défini ; elle n'écoute que sur ``DASHBOARD_API_HOST`` (127.0.0.1 par défaut).
+
+Routes (GET) :
+    /datasets                                fichiers chargés, leurs feuilles, familles et tables
+    /datasets/<fichier>/sheets/<feuille>     lignes d'une feuille
+    /datasets/<fichier>/families/<famille>   toutes les années d'une famille, avec la colonne 'Year'
+    /datasets/<fichier>/tables/<table>       tables calculées (indicateurs)
+
+``<fichier>`` est l'empreinte du fichier, ou ``latest`` pour le dernier chargé.
+
+Paramètres :
+    columns=A,B       colonnes retournées
+    by=A,B            regroupement, avec agg=sum|mean|min|max|count (sum par défaut)
+                      appliqué aux colonnes numériques
+    offset, limit     pagination (limit de 1 à API_MAX_LIMIT)
+    format=arrow      flux Arrow IPC au lieu de JSON
+    <colonne>=valeur  filtre d'égalité, répétable pour plusieurs valeurs
+
+Exemple :
+    curl 'http://127.0.0.1:8502/datasets/latest/families/investissement?by=Year,Programme&columns=Disponible%20(A-B)'
+"""
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pandas as pd
+
+from catalog import build_catalog, combine_years
+from snapshot import load_snapshots
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pyarrow est installé avec streamlit
+    pa = None
+
+API_HOST = os.environ.get('DASHBOARD_API_HOST', '127.0.0.1')
+API_PORT = int(os.environ.get('DASHBOARD_API_PORT', '0'))
+
+# Lignes par page : par défaut et au plus
+API_DEFAULT_LIMIT = 1000
+API_MAX_LIMIT = int(os.environ.get('DASHBOARD_API_MAX_LIMIT', '10000'))
+
+# Fichiers décrits par l'API (les plus récents)
+API_MAX_DATASETS = 20
+
+AGGREGATIONS = ['sum', 'mean', 'min', 'max', 'count']
+RESERVED_PARAMETERS = {'columns', 'by', 'agg', 'offset', 'limit', 'format'}
+
+_datasets = OrderedDict()
+_datasets_lock = threading.Lock()
+_server = None
+_server_lock = threading.Lock()
+
+
+def register_file(file_key, file_name, fingerprints):
+    """Déclare un fichier ouvert dans l'application et l'empreinte de chacune de ses feuilles."""
+    with _datasets_lock:
+        dataset = _datasets.setdefault(file_key, {'name': file_name, 'sheets': {}, 'tables': {}})
+        dataset['sheets'].update(fingerprints)
+        _datasets.move_to_end(file_key)
+        while len(_datasets) > API_MAX_DATASETS:
+            _datasets.popitem(last=False)
+
+
+def register_table(file_key, name, keys):
+    """Déclare une table calculée (ex. indicateurs d'une vue), rangée dans le magasin en parties sous ``keys``."""
+    with _datasets_lock:
+        if file_key in _datasets:
+            _datasets[file_key]['tables'][name] = list(keys)
+
+
+def _dataset(file_key):
+    with _datasets_lock:
+        if file_key == 'latest' and _datasets:
+            file_key = next(reversed(_datasets))
+        if file_key not in _datasets:
+            raise LookupError(f"fichier inconnu : {file_key}")
+        dataset = _datasets[file_key]
+        return file_key, dataset['name'], dict(dataset['sheets']), dict(dataset['tables'])
+
+
+def list_datasets():
+    """Description des fichiers servis, du plus récent au plus ancien."""
+    with _datasets_lock:
+        keys = list(reversed(_datasets))
+    result = []
+    for file_key in keys:
+        _, name, sheets, tables = _dataset(file_key)
+        result.append({'file': file_key, 'name': name, 'sheets': list(sheets),
+                       'families': list(build_catalog(list(sheets))), 'tables': list(tables)})
+    return result
+
+
+def _sheet(store, name, key):
+    df = store.get(key)
+    if df is None:
+        frames, _ = load_snapshots({name: key})
+        if name not in frames:
+            raise LookupError(f"feuille pas encore lue dans l'application : {name}")
+        store.put(key, frames[name])
+        df = frames[name]
+    return df
+
+
+def load_frame(store, file_key, kind, name):
+    """DataFrame désigné par une route : feuille, famille annuelle empilée ou table calculée."""
+    _, _, sheets, tables = _dataset(file_key)
+    if kind == 'sheets':
+        if name not in sheets:
+            raise LookupError(f"feuille inconnue : {name}")
+        return _sheet(store, name, sheets[name])
+    if kind == 'families':
+        catalog = build_catalog(list(sheets))
+        if name not in catalog:
+            raise LookupError(f"famille inconnue : {name}")
+        return combine_years({year: _sheet(store, sheet, sheets[sheet]) for year, sheet in catalog[name].items()})
+    if kind == 'tables':
+        parts = [store.get(key) for key in tables.get(name, [])]
+        if name not in tables or any(df is None for df in parts):
+            raise LookupError(f"table inconnue ou pas encore calculée : {name}")
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    raise LookupError(f"route inconnue : {kind}")
+
+
+def _split(value):
+    return [part for part in value.split(',') if part] if value else []
+
+
+def query_frame(df, filters=None, by=None, agg='sum', columns=None):
+    """Filtre, regroupe et projette ``df``.
+
+    ``filters`` associe une colonne aux valeurs retenues (comparées sous
+    forme de texte) ; avec ``by``, les colonnes numériques sont agrégées
+    par ``agg``. Une colonne inconnue lève une ValueError.
+    """
+    unknown = [column for column in list(filters or {}) + list(by or []) + list(columns or [])
+               if column not in df.columns]
+    if unknown:
+        raise ValueError(f"colonnes inconnues : {', '.join(unknown)}")
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"agrégation inconnue : {agg} (possibles : {', '.join(AGGREGATIONS)})")
+    for column, values in (filters or {}).items():
+        df = df[df[column].astype(str).isin(values)]
+    if by:
+        measures = [column for column in (columns or df.select_dtypes('number').columns) if column not in by]
+        df = df.groupby(list(by), observed=True)[measures].agg(agg).reset_index()
+        columns = list(by) + measures
+    return df[list(columns)] if columns else df
+
+
+def paginate(df, offset=0, limit=API_DEFAULT_LIMIT):
+    """Page de ``df`` et description de la pagination ; ``limit`` doit être au moins 1."""
+    if limit < 1:
+        raise ValueError(f"limit doit être compris entre 1 et {API_MAX_LIMIT}")
+    offset = max(0, offset)
+    limit = min(limit, API_MAX_LIMIT)
+    page = df.iloc[offset:offset + limit]
+    following = offset + limit if offset + limit < len(df) else None
+    return page, {'total': len(df), 'offset': offset, 'limit': limit, 'next': following}
+
+
+def _json_page(page, paging):
+    rows = json.loads(page.to_json(orient='values', date_format='iso')) if len(page) else []
+    return dict(columns=[str(column) for column in page.columns], rows=rows, **paging)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Réponses aux requêtes GET de l'API ; ``store`` est le magasin partagé de l'application."""
+
+    store = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+        params = parse_qs(url.query)
+        try:
+            if parts == ['datasets']:
+                return self._send_json(200, list_datasets())
+            if len(parts) != 4 or parts[0] != 'datasets':
+                raise LookupError(f"route inconnue : {url.path}")
+            df = load_frame(self.store, parts[1], parts[2], parts[3])
+            one = {name: values[-1] for name, values in params.items()}
+            df = query_frame(
+                df,
+                filters={name: values for name, values in params.items() if name not in RESERVED_PARAMETERS},
+                by=_split(one.get('by')),
+                agg=one.get('agg', 'sum'),
+                columns=_split(one.get('columns')),
+            )
+            page, paging = paginate(df, int(one.get('offset', 0)), int(one.get('limit', API_DEFAULT_LIMIT)))
+        except LookupError as e:
+            return self._send_json(404, {'error': str(e)})
+        except (ValueError, TypeError) as e:
+            return self._send_json(400, {'error': str(e)})
+        if one.get('format') == 'arrow' and pa is not None:
+            return self._send_arrow(page, paging)
+        return self._send_json(200, _json_page(page, paging))
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self._send(status, 'application/json; charset=utf-8', body)
+
+    def _send_arrow(self, page, paging):
+        table = pa.Table.from_pandas(page, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        self._send(200, 'application/vnd.apache.arrow.stream', sink.getvalue(), {'X-Total-Count': paging['total']})
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Pas de journal par requête dans la console du serveur Streamlit
+        pass
+
+
+def start_api(store, host=API_HOST, port=API_PORT):
+    """Démarre l'API une seule fois par processus, dans un fil d'exécution en arrière-plan.
+
+    Retourne le serveur, ou None si l'API est désactivée (port 0) ou si le
+    port est déjà occupé.
+    """
+    global _server
+    with _server_lock:
+        if _server is None and port:
+            handler = type('Handler', (QueryHandler,), {'store': store})
+            try:
+                _server = ThreadingHTTPServer((host, port), handler)
+            except OSError:
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name='api', daemon=True).start()
+        return _server
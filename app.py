@@ -1,9 +1,35 @@
+import os
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import plotly.express as px
-from datetime import datetime
+from collections import namedtuple
+import charts
+import kpis
+import timeseries
+from api import API_PORT, register_file, register_table, start_api
+from cache import Lease, content_hash, frame_nbytes, shared_store
+from catalog import build_catalog, list_sheet_names, section_data, sheet_fingerprints, sheets_for
+from instrumentation import Recorder, figure_size
+from jobs import FAILED, PENDING, READY, job_queue, wait_jobs
+from loader import read_headers, read_sheets
+from roster import read_roster_csv, roster_sheet_names
+from schema import check_headers, describe_missing, expected_columns
+from snapshot import read_with_snapshots
+from warmup import start_warm_up
+
+# Imports et modèles Plotly préparés en arrière-plan, une fois par processus
+start_warm_up()
+
+# API locale sur les données chargées (voir api.py), si DASHBOARD_API_PORT est défini
+if API_PORT and start_api(shared_store()) is None:
+    st.sidebar.caption(f"API locale indisponible : le port {API_PORT} est déjà utilisé.")
+
+
+@st.cache_resource
+def load_asset(path):
+    # Images lues une seule fois par processus, pas à chaque réexécution
+    with open(path, 'rb') as f:
+        return f.read()
+
 
 # Ajouter le logo à la barre latérale avec un style CSS pour le déplacer légèrement vers la gauche
 st.sidebar.markdown(
@@ -18,7 +44,7 @@ st.sidebar.markdown(
 )
 
 # Ajouter le logo à la barre latérale
-st.sidebar.image("logo.png", width=380)
+st.sidebar.image(load_asset("logo.png"), width=380)
 
 # Ajouter un titre à la barre latérale
 st.sidebar.markdown("# Tableau de bord")
@@ -33,6 +59,18 @@ empty_col, logo_col = st.columns([1, 4])  # Ajustez les proportions pour contrô
 with empty_col:
     st.write("")  # Colonne vide pour créer un espace
 
+# Mode allégé : années et indicateurs filtrés côté serveur, seules les traces affichées sont envoyées
+compact_charts = st.sidebar.checkbox(
+    "Graphiques allégés (connexion lente)",
+    value=os.environ.get('DASHBOARD_COMPACT_CHARTS') == '1'
+)
+
+# Mesures de performance (lecture, transformation, figures, rendu), à activer pour le diagnostic
+instrumentation = st.sidebar.checkbox(
+    "Mesures de performance",
+    value=os.environ.get('DASHBOARD_INSTRUMENT') == '1'
+)
+
 # Charger le fichier depuis la barre latérale
 uploaded_file = st.sidebar.file_uploader("Choisir un fichier", type=["xlsx", "xls", "csv"])
 
@@ -46,7 +84,7 @@ if uploaded_file is None:
 
     # Colonne pour afficher le logo (droite)
     with col2:
-        st.image("Lo.png", width=400)  # Ajustez la largeur du logo selon vos besoins
+        st.image(load_asset("Lo.png"), width=400)  # Ajustez la largeur du logo selon vos besoins
 
     # Paragraphe combiné avec un léger décalage vers le haut
     st.markdown(
@@ -66,748 +104,661 @@ if uploaded_file is None:
         unsafe_allow_html=True
     )
 
-def calculate_indicators(df):
-    # Convertir les colonnes en numériques
-    df['Crédits ouverts  (A)'] = pd.to_numeric(df['Crédits ouverts  (A)'], errors='coerce')
-    df['Engagements \n(B)'] = pd.to_numeric(df['Engagements \n(B)'], errors='coerce')
-    df['Paiements \n(C)'] = pd.to_numeric(df['Paiements \n(C)'], errors='coerce')
-    
-    total_credits = df['Crédits ouverts  (A)'].sum()
-    total_engagements = df['Engagements \n(B)'].sum()
-    total_payments = df['Paiements \n(C)'].sum()
-    return total_credits, total_engagements, total_payments
-
-# Assurez-vous que 'uploaded_file' est défini dans votre code avant d'utiliser cette condition
-if data_type == "Finance":
-    try:
-        # Lecture des données financières
-        excel_data = pd.ExcelFile(uploaded_file)
-        # Ajouter la nouvelle visualisation pour les sources de budget
-        
-       # Charger les données du fichier Excel pour le budget
-        budget_2022 = pd.read_excel(excel_data, sheet_name='Budget_CNRST_Source_2022')
-        budget_2023 = pd.read_excel(excel_data, sheet_name='Budget_CNRST_Source_2023')
-        # Convertir les colonnes numériques
-        budget_2022['Dotation reçue'] = pd.to_numeric(budget_2022['Dotation reçue'], errors='coerce').fillna(0)
-        budget_2023['Dotation reçue'] = pd.to_numeric(budget_2023['Dotation reçue'], errors='coerce').fillna(0)
-
-
-        # Ajouter les colonnes 'Year'
-        budget_2022['Year'] = 2022
-        budget_2023['Year'] = 2023
-
-        # Combiner les données en un seul DataFrame
-        budget_all_years = pd.concat([budget_2022, budget_2023])
-
-        # Filtrer les données pour les sources spécifiques
-        selected_sources = ["Budget général d'Etat (ministère de tutelle)", "FNSRSDT", "Recettes propres"]
-        filtered_data = budget_all_years[budget_all_years['Source'].isin(selected_sources)]
-
-        # Calcul des indicateurs pour le budget
-        total_budget_2022 = budget_2022['Dotation reçue'].sum()
-        total_budget_2023 = budget_2023['Dotation reçue'].sum()
-
-        # Afficher les indicateurs de budget dans des colonnes
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.info("Budget Total 2022", icon="📊")
-            st.metric(label="Total Dotation 2022", value=f"{total_budget_2022:.2f}")
-
-        with col2:
-            st.info("Budget Total 2023", icon="💰")
-            st.metric(label="Total Dotation 2023", value=f"{total_budget_2023:.2f}")
-
-        # Créer la figure pour le graphique en lignes
-        fig_sources = go.Figure()
-
-        # Définir les couleurs pour chaque source
-        source_colors = {
-            "Budget général d'Etat (ministère de tutelle)": 'blue',
-            "FNSRSDT": 'green',
-            "Recettes propres": 'red'
-        }
+def get_lease():
+    """Références de la session sur le magasin partagé, libérées à la fin de la session.
+
+    Les feuilles lues sont communes à toutes les sessions du serveur : un
+    classeur ouvert par plusieurs utilisateurs n'est lu et gardé qu'une fois.
+    """
+    if 'store_lease' not in st.session_state:
+        st.session_state['store_lease'] = Lease(shared_store())
+    lease = st.session_state['store_lease']
+    lease.switch(file_key)
+    return lease
+
+
+def get_recorder():
+    # Mesures conservées dans la session, comme le cache des feuilles
+    if 'recorder' not in st.session_state:
+        st.session_state['recorder'] = Recorder()
+    return st.session_state['recorder']
 
-        # Ajouter une ligne pour chaque source sélectionnée avec une couleur spécifique
-        for source in selected_sources:
-            df_source = filtered_data[filtered_data['Source'] == source]
-            fig_sources.add_trace(go.Scatter(
-                x=df_source['Year'],
-                y=df_source['Dotation reçue'],
-                mode='lines+markers',  # Ajouter des marqueurs à chaque point de données
-                name=source,
-                line=dict(color=source_colors[source], width=2)
-            ))
-
-        # Mettre à jour la mise en page
-        fig_sources.update_layout(
-            title="Evolution de Budget Sources",
-            xaxis_title="Year",
-            yaxis_title="Dotation reçue",
-            legend_title="Source",
-            xaxis=dict(tickmode='linear'),  
-            )
-        # Affichage du graphique de lignes dans Streamlit
-        st.plotly_chart(fig_sources)
-
-
-        # Traitement des données d'exploitation
-        exploitation_2021 = pd.read_excel(excel_data, sheet_name='Exploitation 2021')
-        exploitation_2022 = pd.read_excel(excel_data, sheet_name='Exploitation 2022')
-
-        # Ajout des colonnes 'Year' pour exploitation
-        exploitation_2021['Year'] = 2021
-        exploitation_2022['Year'] = 2022
-
-        # Combinaison des données d'exploitation
-        exploitation_all_years = pd.concat([exploitation_2021, exploitation_2022])
-        # Création de la figure pour exploitation
-        fig_exploitation = make_subplots(rows=1, cols=1, shared_xaxes=True)
-
-        # Ajout des traces pour chaque année (exploitation)
-        for year in [2021, 2022]:
-            df_year = exploitation_all_years[exploitation_all_years['Year'] == year]
-            for financial_type in ['Crédits ouverts  (A)', 'Engagements \n(B)', 'Paiements \n(C)']:
-                fig_exploitation.add_trace(go.Bar(
-                    x=df_year['Programme'],
-                    y=df_year[financial_type],
-                    name=f'{financial_type} - {year}',
-                    visible='legendonly'
-                ))
-                # Obtention de l'année actuelle
-                current_year = datetime.now().year
-        # Ajout du menu déroulant pour exploitation
-        fig_exploitation.update_layout(
-            updatemenus=[
-                dict(
-                    type="dropdown",
-                    showactive=True,
-                    buttons=[
-                        dict(label="2021",
-                             method="update",
-                             args=[{"visible": [True if '2021' in trace.name else False for trace in fig_exploitation.data]},
-                                   {"title": "Exploitation - 2021"}]),
-                        dict(label="2022",
-                             method="update",
-                             args=[{"visible": [True if '2022' in trace.name else False for trace in fig_exploitation.data]},
-                                   {"title": "Exploitation - 2022"}]),
-                        dict(label=str(current_year),
-                         method="update",
-                         args=[{"visible": [True if f'{current_year}' in trace.name else False for trace in fig_exploitation.data]},
-                           {"title": f"Investment Data - {current_year}"}])
-                    ]
-                )
-            ],
-            title="Financial Data by Year",
-            xaxis_title="Programme",
-            yaxis_title="Value"
-        )
-
-        # Affichage de la figure exploitation dans Streamlit
-        st.plotly_chart(fig_exploitation)
-
-        # Lecture des données d'investissement
-        investment_2021 = pd.read_excel(excel_data, sheet_name='Invistissement2021')
-        investment_2022 = pd.read_excel(excel_data, sheet_name='Investissement2022')
-        investment_2023 = pd.read_excel(excel_data, sheet_name='Investissement 2023')
-
-        # Ajout des colonnes 'Year' pour investissement
-        investment_2021['Year'] = 2021
-        investment_2022['Year'] = 2022
-        investment_2023['Year'] = 2023
-
-        # Combinaison des données d'investissement
-        investment_all_years = pd.concat([investment_2021, investment_2022, investment_2023])
-
-        # Sélection des colonnes à afficher pour investissement
-        columns_to_plot_investment = ['Crédits ouverts Hors reports (A)', 'Engagements Hors Reports (B)', '% Engagement',
-                                      'Paiements Hors Reports (C)', '% Paiement', 'Reports\nD= (B-C)', 'Disponible (A-B)']
-
-        # Création de la figure pour investissement
-        fig_investment = make_subplots(rows=1, cols=1, shared_xaxes=True)
-
-        # Ajout des traces pour chaque année (investissement)
-        for year in [2021, 2022, 2023]:
-            df_year = investment_all_years[investment_all_years['Year'] == year]
-            for financial_type in columns_to_plot_investment:
-                fig_investment.add_trace(go.Bar(
-                    x=df_year['Programme'],
-                    y=df_year[financial_type],
-                    name=f'{financial_type} - {year}',
-                    visible='legendonly'
-                ))
-                # Obtention de l'année actuelle
-            current_year = datetime.now().year
-
-         #Ajout du menu déroulant pour investissement
-        fig_investment.update_layout(
-            updatemenus=[
-        dict(
-            type="dropdown",
-            showactive=True,
-            buttons=[
-                dict(label="All Years",
-                     method="update",
-                     args=[{"visible": [True] * len(fig_investment.data)},
-                           {"title": "Investment Data by Year"}]),
-                dict(label="2021",
-                     method="update",
-                     args=[{"visible": [True if '2021' in trace.name else False for trace in fig_investment.data]},
-                           {"title": "Investment Data - 2021"}]),
-                dict(label="2022",
-                     method="update",
-                     args=[{"visible": [True if '2022' in trace.name else False for trace in fig_investment.data]},
-                           {"title": "Investment Data - 2022"}]),
-                dict(label="2023",
-                     method="update",
-                     args=[{"visible": [True if '2023' in trace.name else False for trace in fig_investment.data]},
-                           {"title": "Investment Data - 2023"}]),
-                dict(label=str(current_year),
-                     method="update",
-                     args=[{"visible": [True if f'{current_year}' in trace.name else False for trace in fig_investment.data]},
-                           {"title": f"Investment Data - {current_year}"}])
-            ]
-        )
-    ],
-    title="Investment Data by Year",
-    xaxis_title="Programme",
-    yaxis_title="Value"
-)
-        # Affichage de la figure investissement dans Streamlit
-        st.plotly_chart(fig_investment)
-
-       
-         # Load data from 'Marchés Pluriannuel' sheets
-        marches_2021 = pd.read_excel(excel_data, sheet_name='Marchés Pluriannuel 2021')
-        marches_2022 = pd.read_excel(excel_data, sheet_name='Marchés Pluriannuel 2022')
-        marches_2023 = pd.read_excel(excel_data, sheet_name='Marchés Pluriannuel 2023')
-
-        # Add 'Year' columns
-        marches_2021['Year'] = 2021
-        marches_2022['Year'] = 2022
-        marches_2023['Year'] = 2023
-
-        # Combine the data into one DataFrame
-        marches_all_years = pd.concat([marches_2021, marches_2022, marches_2023])
-
-        # Define the columns to plot
-        columns_to_plot = ['Nombre de contrats', 'Montant en Dhs ']
-
-        # Create the bar chart figure
-        fig_marches = go.Figure()
-
-        # Add traces for each type of data for each year
-        for year in [2021, 2022, 2023]:
-            df_year = marches_all_years[marches_all_years['Year'] == year]
-            for column in columns_to_plot:
-                fig_marches.add_trace(go.Bar(
-                    x=df_year['Objet'],
-                    y=df_year[column],
-                    name=f'{column} - {year}',
-                    visible='legendonly'
-                ))
-
-        # Add dropdown menu for year selection
-        fig_marches.update_layout(
-            updatemenus=[
-                dict(
-                    type="dropdown",
-                    showactive=True,
-                    buttons=[
-                        dict(label="2021",
-                             method="update",
-                             args=[{"visible": [True if '2021' in trace.name else False for trace in fig_marches.data]},
-                                   {"title": "Marchés Pluriannuel Data - 2021"}]),
-                        dict(label="2022",
-                             method="update",
-                             args=[{"visible": [True if '2022' in trace.name else False for trace in fig_marches.data]},
-                                   {"title": "Marchés Pluriannuel Data - 2022"}]),
-                        dict(label="2023",
-                             method="update",
-                             args=[{"visible": [True if '2023' in trace.name else False for trace in fig_marches.data]},
-                                   {"title": "Marchés Pluriannuel Data - 2023"}]),
-                        dict(label=str(current_year),
-                            method="update",
-                            args=[{"visible": [True if f'{current_year}' in trace.name else False for trace in fig_marches.data]},
-                           {"title": f"Investment Data - {current_year}"}])
-                    ]
-                )
-            ],
-            title="Marchés Pluriannuel Data by Year",
-            xaxis_title="Objet",
-            yaxis_title="Value",
-            barmode='group'
-        )
-
-        # Display the interactive bar chart in Streamlit
-        st.plotly_chart(fig_marches)
-          
-      # New Visualization: Achat Marché Nature Exploit by Year
-        nature_exploit_2022 = pd.read_excel(excel_data, sheet_name='Achat Marché nature_Exploit2022')
-        nature_exploit_2023 = pd.read_excel(excel_data, sheet_name='Achat Marché nature_Exploit2023')
-
-        # Add 'Year' columns
-        nature_exploit_2022['Year'] = 2022
-        nature_exploit_2023['Year'] = 2023
-
-        # Combine the data into one dataframe
-        nature_combined = pd.concat([nature_exploit_2022, nature_exploit_2023])
-
-        # Create the bar chart figure
-        fig_nature = go.Figure()
-
-        # Add traces for each type of data for each year
-        for year in [2022, 2023]:
-            df_year = nature_combined[nature_combined['Year'] == year]
-            fig_nature.add_trace(go.Bar(
-                x=df_year['Nature'],
-                y=df_year['Nombre de marché '],
-                name=f'Nombre de marché - {year}',
-                visible=(year == 2022)  # Only the first year is visible initially
-            ))
-            fig_nature.add_trace(go.Bar(
-                x=df_year['Nature'],
-                y=df_year['Montant en Dhs'],
-                name=f'Montant en Dhs - {year}',
-                visible=(year == 2022)  # Only the first year is visible initially
-            ))
-
-        # Add dropdown menu for year selection
-        fig_nature.update_layout(
-            updatemenus=[
-                dict(
-                    type="dropdown",
-                    showactive=True,
-                    buttons=[
-                        dict(label="2022",
-                             method="update",
-                             args=[{"visible": [True if '2022' in trace.name else False for trace in fig_nature.data]},
-                                   {"title": "Achat Marché Nature Exploit 2022"}]),
-                        dict(label="2023",
-                             method="update",
-                             args=[{"visible": [True if '2023' in trace.name else False for trace in fig_nature.data]},
-                                   {"title": "Achat Marché Nature Exploit 2023"}]),
-                        dict(label=str(current_year),
-                            method="update",
-                         args=[{"visible": [True if f'{current_year}' in trace.name else False for trace in fig_nature.data]},
-                           {"title": f"Investment Data - {current_year}"}])
-                    ]
-                )
-            ],
-            title="Achat Marché Nature Exploit by Year",
-            xaxis_title="Nature",
-            yaxis_title="Value",
-            barmode='group',
-            legend_title="Legend",
-            xaxis_tickangle=-45
-        )
-
-         # Display the interactive bar chart in Streamlit
-        st.plotly_chart(fig_nature)
-          
-          # Load data from the sheets
-        achat_nature_2021 = pd.read_excel(excel_data, sheet_name='Achat Marché  nature Invis2021')
-        achat_nature_2022 = pd.read_excel(excel_data, sheet_name='Achat Marché nature Invisti2022')
-        achat_nature_2023 = pd.read_excel(excel_data, sheet_name='Achat Marché par nature Inves23')
-
-         # Add 'Year' columns
-        achat_nature_2021['Year'] = 2021
-        achat_nature_2022['Year'] = 2022
-        achat_nature_2023['Year'] = 2023
-
-        # Combine the data into one dataframe
-        achat_nature_all_years = pd.concat([achat_nature_2021, achat_nature_2022, achat_nature_2023])
-
-        # Define the columns to plot
-        columns_to_plot = ['Nombre de marché ', 'Montant en Dhs']
-
-        # Create the stacked bar chart figure
-        fig = go.Figure()
-
-         # Add traces for each type of data for each year
-        for year in [2021, 2022, 2023]:
-           df_year = achat_nature_all_years[achat_nature_all_years['Year'] == year]
-           fig.add_trace(go.Bar(
-           x=df_year['Nature'],
-           y=df_year['Nombre de marché '],
-           name=f'Nombre de marché - {year}',
-           visible='legendonly'
-        ))
-           fig.add_trace(go.Bar(
-           x=df_year['Nature'],
-            y=df_year['Montant en Dhs'],
-            name=f'Montant en Dhs - {year}',
-            visible='legendonly'
-        ))
-
-         # Add dropdown menu for year selection
-        fig.update_layout(
-              updatemenus=[
-        dict(
-            type="dropdown",
-            showactive=True,
-            buttons=[
-                dict(label="2021",
-                     method="update",
-                     args=[{"visible": [True if '2021' in trace.name else False for trace in fig.data]},
-                           {"title": "Achat Marché Nature investissemnt- 2021"}]),
-                dict(label="2022",
-                     method="update",
-                     args=[{"visible": [True if '2022' in trace.name else False for trace in fig.data]},
-                           {"title": "Achat Marché Nature investissemnt - 2022"}]),
-                dict(label="2023",
-                     method="update",
-                     args=[{"visible": [True if '2023' in trace.name else False for trace in fig.data]},
-                           {"title": "Achat Marché Nature investissemnt - 2023"}]),
-                dict(label=str(current_year),
-                            method="update",
-                         args=[{"visible": [True if f'{current_year}' in trace.name else False for trace in fig.data]},
-                           {"title": f"Investment Data - {current_year}"}])
-                ]
-            )
-            ],
-                    title="Achat Marché investi Nature by Year",
-                    xaxis_title="Nature",
-                    yaxis_title="Value",
-                    barmode='stack'
-                )
-
-           # Display the interactive stacked bar chart in Streamlit
-        st.plotly_chart(fig)
-                # Charger les données des feuilles de calcul
-        achat_cdc_2021 = pd.read_excel(excel_data, sheet_name='Achat CDC par Budget2021')
-        achat_cdc_2022 = pd.read_excel(excel_data, sheet_name='Achat CDC par Budget 2022')
-        achat_cdc_2023 = pd.read_excel(excel_data, sheet_name='Achat CDC par Budget 2023')
-
-         # Ajouter les colonnes 'Year'
-        achat_cdc_2021['Year'] = 2021
-        achat_cdc_2022['Year'] = 2022
-        achat_cdc_2023['Year'] = 2023
-
-        # Combiner les données en un seul DataFrame
-        achat_cdc_all_years = pd.concat([achat_cdc_2021, achat_cdc_2022, achat_cdc_2023])
-
-          # Créer la figure du graphique en barres empilées
-        fig = go.Figure()
-
-      # Ajouter des traces pour chaque année
-        for year in [2021, 2022, 2023]:
-                df_year = achat_cdc_all_years[achat_cdc_all_years['Year'] == year]
-                fig.add_trace(go.Bar(
-                x=df_year['Budget'],
-                y=df_year['Nombre de CDC '],
-                name=f'Nombre de CDC - {year}',
-                marker_color='rgba(55, 83, 109, 0.7)'
-              ))
-                fig.add_trace(go.Bar(
-                x=df_year['Budget'],
-                y=df_year['Montant en Dhs'],
-                name=f'Montant en Dhs - {year}',
-                marker_color='rgba(255, 144, 14, 0.7)'
-              ))
-
-               # Mettre à jour la mise en page pour l'apparence des barres empilées
-                fig.update_layout(
-                barmode='stack',
-                title="Achat CDC par Budget par Année",
-                xaxis_title="Budget",
-                yaxis_title="Valeurs (Nombre de CDC / Montant en Dhs)",
-               legend_title="Année",
-               )
-
-               # Afficher le graphique interactif dans Streamlit
-        st.plotly_chart(fig)
-               
-                # Load data from the sheets
-       
-        synthese_2023 = pd.read_excel(excel_data, sheet_name='Synthese par type 2023')
-
-                # Add 'Year' columns
-        
-        synthese_2023['Year'] = 2023
-
-                # Combine the data into one dataframe
-        synthese_all_years = pd.concat([ synthese_2023])
-
-                # Create the donut chart figure
-        fig = go.Figure()
-
-               # Add donut chart traces for each year
-        for year in [ 2023]:
-                df_year = synthese_all_years[synthese_all_years['Year'] == year]
-                fig.add_trace(go.Pie(
-                labels=df_year['Type'],
-                values=df_year['Marché'],  # Replace with the column you want to visualize
-                name=f'{year}',
-                hole=0.4,  # Creates the donut shape
-                hoverinfo='label+percent+name',  # Shows the label, percentage, and year on hover
-                title=f"Année {year}",
-               
-            ))
-
-                # Update layout to arrange the donut charts
-        fig.update_layout(
-               title_text="Synthese par Type Data -  by Year",
-            annotations=[
-            
-                dict(text='', x=0.83, y=0.5, font_size=12, showarrow=False)
-            ],
-               showlegend=True
-           )
-
-         # Show the interactive donut chart in Streamlit
-        st.plotly_chart(fig)
 
-        # Load data from the sheets
-        recettes_fonctionnement = pd.read_excel(excel_data, sheet_name='Recettes_Fonctionnement_2023')
-        recettes_investissement = pd.read_excel(excel_data, sheet_name='Recettes_Invistissement_2023')
-        recettes_propres = pd.read_excel(excel_data, sheet_name='RecettesPropres2023')
-
-        # Add 'Category' columns
-        recettes_fonctionnement['Category'] = 'Fonctionnement'
-        recettes_investissement['Category'] = 'Investissement'
-        recettes_propres['Category'] = 'Propres'
-
-        # Combine the data into one dataframe
-        recettes_all = pd.concat([recettes_fonctionnement, recettes_investissement, recettes_propres])
-        
-       # Create a filter for categories
-        selected_categories = st.multiselect('Select Categories',
-         options=recettes_all['Category'].unique(),
-         default=recettes_all['Category'].unique()  # Default to all categories
-        )
-
-        # Filter the data based on selected categories
-        filtered_data = recettes_all[recettes_all['Category'].isin(selected_categories)]
-
-        # Create the bar chart figure
-        fig = go.Figure()
-
-        # Add traces for each category
-        for category in recettes_all['Category'].unique():
-          df_category = recettes_all[recettes_all['Category'] == category]
-        if category == 'Propres':
-          fig.add_trace(go.Bar(
-            x=df_category['Désignation'] if 'Désignation' in df_category.columns else df_category['Subvention'],
-            y=df_category['Montant en Dhs'],
-            name=f'{category} - Montant en Dhs'
-            ))
+def sheet_jobs(sheet_names):
+    """Lectures en arrière-plan des feuilles absentes du magasin partagé : {empreinte: tâche}.
+
+    Une feuille déjà en cours de lecture, pour cette session ou une autre,
+    n'est pas relancée : sa tâche est simplement retournée.
+    """
+    lease = get_lease()
+    fingerprints = get_sheet_fingerprints()
+    if is_csv:
+        # Un passage sur l'export produit toutes ses feuilles : une seule tâche les lit toutes
+        sheet_names = get_sheet_names()
+    sheet_keys = {name: fingerprints[name] for name in sheet_names}
+    lease.hold(sheet_keys.values())
+    reader = read_roster_csv if is_csv else read_sheets
+    return job_queue(lease.store).submit(uploaded_file.getvalue(), sheet_keys, reader)
+
+
+def record_jobs(jobs):
+    # Mesures de lecture de chaque tâche suivie, enregistrées une fois par session
+    recorded = st.session_state.setdefault('recorded_jobs', set())
+    for job in jobs:
+        if job.done() and job.id not in recorded:
+            recorded.add(job.id)
+            st.session_state.setdefault('load_stats', {}).update((s.sheet, s) for s in job.stats)
+            get_recorder().record('lecture', job.stats)
+
+
+def load_sheets(sheet_names):
+    """Retourne les feuilles demandées, en attendant la fin de leur lecture en arrière-plan.
+
+    Le cache est indexé par empreinte de feuille : après le chargement d'une
+    nouvelle version du classeur, seules les feuilles modifiées sont relues.
+    """
+    fingerprints = get_sheet_fingerprints()
+    jobs = sheet_jobs(sheet_names)
+    if jobs:
+        wait_jobs(set(jobs.values()))
+        record_jobs(set(jobs.values()))
+        for name in sheet_names:
+            job = jobs.get(fingerprints[name])
+            if job is not None and job.status[fingerprints[name]] == FAILED:
+                raise job.error
+    cache = get_lease().store
+    frames = {name: cache.get(fingerprints[name]) for name in sheet_names}
+    missing = {name: fingerprints[name] for name, df in frames.items() if df is None}
+    if missing:
+        # Feuilles évincées du magasin entre leur lecture et leur affichage ;
+        # un export CSV est relu en entier, toutes ses feuilles sont gardées
+        reader = read_roster_csv if is_csv else read_sheets
+        to_read = {name: fingerprints[name] for name in get_sheet_names()} if is_csv else missing
+        loaded, stats = read_with_snapshots(uploaded_file, to_read, reader=reader)
+        for name, df in loaded.items():
+            cache.put(fingerprints[name], df)
+            if name in frames:
+                frames[name] = df.copy()
+        st.session_state.setdefault('load_stats', {}).update((s.sheet, s) for s in stats)
+        get_recorder().record('lecture', stats)
+    return frames
+
+
+def get_sheet_names():
+    """Noms des feuilles du fichier, lus une fois par fichier."""
+    sheet_names = st.session_state.setdefault('sheet_names', {})
+    if file_key not in sheet_names:
+        # Un export CSV donne les feuilles « Répartition par ... » qu'il permet de calculer
+        sheet_names[file_key] = (roster_sheet_names(uploaded_file) if is_csv
+                                 else list_sheet_names(uploaded_file.getvalue()))
+    return sheet_names[file_key]
+
+
+def get_sheet_fingerprints():
+    """Empreinte de chaque feuille du fichier, calculée une fois par fichier."""
+    fingerprints = st.session_state.setdefault('sheet_fingerprints', {})
+    if file_key not in fingerprints:
+        fingerprints[file_key] = sheet_fingerprints(uploaded_file.getvalue(), get_sheet_names())
+        register_file(file_key, uploaded_file.name, fingerprints[file_key])
+    return fingerprints[file_key]
+
+
+def get_catalog():
+    """Catalogue des feuilles annuelles du fichier, construit une fois par fichier."""
+    catalogs = st.session_state.setdefault('catalogs', {})
+    if file_key not in catalogs:
+        catalogs[file_key] = build_catalog(get_sheet_names())
+    return catalogs[file_key]
+
+
+def get_missing_columns():
+    """Colonnes manquantes par feuille, vérifiées une fois par fichier sur les seuls en-têtes."""
+    missing = st.session_state.setdefault('missing_columns', {})
+    if file_key not in missing:
+        if is_csv:
+            # Feuilles calculées par roster.py, toujours conformes
+            missing[file_key] = {}
         else:
-          fig.add_trace(go.Bar(
-            x=df_category['Subvention'],
-            y=df_category['Montant en dhs'],
-            name=f'{category} - Montant en dhs'
-           ))
-
-         # Update the layout with title and labels
-        fig.update_layout(
-        title='Revenues by Category for 2023',
-        xaxis_title='Category',
-        yaxis_title='Montant en Dhs',
-         barmode='stack'  # Use 'group' if you prefer separate bars for each category
-        )
-
-             # Display the interactive bar chart in Streamlit
+            expected = expected_columns(get_catalog(), get_sheet_names())
+            missing[file_key] = check_headers(read_headers(uploaded_file, list(expected)), expected)
+    return missing[file_key]
+
+
+def is_valid(sheet_names):
+    """Vrai si aucune des feuilles n'a de colonne manquante."""
+    return not any(name in get_missing_columns() for name in sheet_names)
+
+
+def load_section(section):
+    """Feuilles d'une section : par nom, et par famille avec toutes ses années empilées.
+
+    Une section dont une feuille ne respecte pas le registre (schema.py) est
+    refusée avant toute lecture complète.
+    """
+    catalog = get_catalog()
+    names = sheets_for(catalog, section.sheet_names, section.families)
+    missing = {name: get_missing_columns()[name] for name in names if name in get_missing_columns()}
+    if missing:
+        raise ValueError(describe_missing(missing))
+    sheets = load_sheets(names)
+    with get_recorder().measure('transformation', section.title) as sizes:
+        data = section_data(catalog, sheets, section.sheet_names, section.families)
+        sizes['rows'] = sum(len(df) for df in data.values())
+        sizes['nbytes'] = sum(frame_nbytes(df) for df in data.values())
+    return data
+
+
+def cached_figure(name, build, *state):
+    """Figure mémorisée pour la version du fichier et l'état des filtres du graphique.
+
+    Seule la dernière figure de chaque graphique est conservée ; elle n'est
+    reconstruite que si le fichier ou l'un des filtres change.
+    """
+    figures = st.session_state.setdefault('figures', {})
+    # Le fichier fait partie de l'état comparé : la figure d'un classeur
+    # précédent est remplacée, pas conservée à côté
+    state = (file_key,) + state
+    entry = figures.get(name)
+    if entry is None or entry[0] != state:
+        entry = (state, build())
+        figures[name] = entry
+    return entry[1]
+
+
+def kpi_sections(view, families=None):
+    """Groupes de feuilles de la table des indicateurs d'une vue : un par famille en Finance, un seul en RH.
+
+    Chaque groupe est calculé et mis en cache séparément ; avec ``families``,
+    seuls les groupes de ces familles sont retournés. Les feuilles absentes
+    ou non conformes sont ignorées plutôt que bloquantes.
+    """
+    catalog = get_catalog()
+    if view == "Finance":
+        return [Section(view, None, families=[family]) for family in kpis.FINANCE_FAMILIES
+                if family in catalog and is_valid(catalog[family].values())
+                and (families is None or family in families)]
+    sheet_names = [name for name in kpis.RH_SHEETS if name in get_sheet_names() and is_valid([name])]
+    return [Section(view, None, sheet_names=sheet_names)]
+
+
+def kpi_key(section):
+    # Indicateurs indexés par les empreintes de leurs feuilles : une nouvelle
+    # version du classeur qui ne les modifie pas réutilise la table existante
+    fingerprints = get_sheet_fingerprints()
+    names = sheets_for(get_catalog(), section.sheet_names, section.families)
+    return ('kpis', section.title, tuple(section.families)) + tuple(fingerprints[name] for name in names)
+
+
+def kpi_part(section):
+    """Indicateurs d'un groupe de feuilles, calculés une seule fois par version de ces feuilles.
+
+    Comme les feuilles, ils sont partagés entre les sessions.
+    """
+    lease = get_lease()
+    key = kpi_key(section)
+    lease.hold([key])
+    table = lease.store.get(key)
+    if table is None:
+        data = load_section(section)
+        name = f"Indicateurs {section.title} {' '.join(section.families)}".strip()
+        with get_recorder().measure('transformation', name) as sizes:
+            table = kpis.finance_kpis(data) if section.title == "Finance" else kpis.rh_kpis(data)
+            sizes['rows'] = len(table)
+            sizes['nbytes'] = frame_nbytes(table)
+        lease.store.put(key, table)
+    return table
+
+
+def get_kpis(view, families=None):
+    """Table des indicateurs d'une vue, éventuellement limitée à certaines familles.
+
+    Les cartes du budget ne demandent que 'budget_source' : elles
+    s'affichent sans attendre la lecture des feuilles d'exploitation et
+    d'investissement.
+    """
+    sections = kpi_sections(view, families)
+    table = kpis.combine_kpis([kpi_part(section) for section in sections])
+    if families is None:
+        register_table(file_key, f"indicateurs {view}", [kpi_key(section) for section in sections])
+    return table
+
+
+def kpis_ready(view):
+    """Vrai si toute la table des indicateurs de la vue est déjà calculée."""
+    store = shared_store()
+    return all(kpi_key(section) in store for section in kpi_sections(view))
+
+
+def show_figure(name, build, *state):
+    """Affiche la figure mémorisée ``name`` (voir ``cached_figure``), en mesurant sa construction et son rendu."""
+    recorder = get_recorder()
+    with recorder.measure('figure', name):
+        fig = cached_figure(name, build, *state)
+    # Taille calculée hors mesure : sérialiser la figure une seconde fois ne doit pas compter dans le rendu
+    points, payload = figure_size(fig) if recorder.enabled else (0, 0)
+    with recorder.measure('rendu', name) as sizes:
         st.plotly_chart(fig)
+        sizes['rows'] = points
+        sizes['nbytes'] = payload
 
-    except Exception as e:
-        st.error(f"An error occurred: {e}")
 
+get_recorder().enable(instrumentation)
 
-    
-elif data_type == "Ressources humaines":
+# Empreinte du contenu calculée une seule fois par exécution
+file_key = content_hash(uploaded_file) if uploaded_file is not None else None
+
+# Export CSV du personnel (voir roster.py) plutôt que classeur Excel
+is_csv = uploaded_file is not None and uploaded_file.name.lower().endswith('.csv')
+
+# Les sections avec des filtres sont des fragments : changer un filtre ne
+# réexécute que la section concernée (sans effet si Streamlit est trop ancien)
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
+
+# Section du tableau de bord : titre, fonction d'affichage, feuilles lues telles
+# quelles, familles de feuilles annuelles (voir catalog.py), ouverte par défaut,
+# utilise la table des indicateurs de la vue
+Section = namedtuple('Section', ['title', 'render', 'sheet_names', 'families', 'expanded', 'uses_kpis'],
+                     defaults=[(), (), False, False])
+
+# Intervalle de mise à jour de la progression des lectures en arrière-plan (s)
+JOB_POLL_SECONDS = float(os.environ.get('DASHBOARD_JOB_POLL_SECONDS', '0.5'))
+
+
+def yearly_selection(name, df, columns):
+    """Années et indicateurs choisis par l'utilisateur en mode allégé, sinon None."""
+    if not compact_charts:
+        return None
+    years = sorted(df['Year'].unique())
+    col1, col2 = st.columns(2)
+    selected_years = col1.multiselect("Années", years, default=years[-1:], key=f"{name}_years")
+    selected_columns = col2.multiselect("Indicateurs", columns, default=columns, key=f"{name}_columns")
+    return tuple(selected_years), tuple(selected_columns)
+
+
+def render_budget_sources(data):
+    # Toutes les années 'Budget_CNRST_Source_*' du classeur
+    budget_all_years = data['budget_source']
+
+    # Indicateurs de budget lus dans la table des indicateurs
+    table = get_kpis("Finance", families=['budget_source'])
+    totals = kpis.kpi_series(table, 'Budget', 'Dotation reçue')
+    evolutions = kpis.kpi_series(table, 'Budget', 'Dotation reçue - évolution (%)')
+
+    # Afficher les indicateurs de budget dans des colonnes, une par année
+    icons = ["📊", "💰"]
+    for i, (col, (year, total)) in enumerate(zip(st.columns(len(totals)), totals.items())):
+        with col:
+            st.info(f"Budget Total {year}", icon=icons[i % len(icons)])
+            evolution = evolutions.get(year)
+            st.metric(label=f"Total Dotation {year}", value=f"{total:.2f}",
+                      delta=None if pd.isna(evolution) else f"{evolution:.1f} %")
+
+    show_figure(
+        'budget_sources', lambda: charts.budget_sources_figure(timeseries.budget_series(budget_all_years))
+    )
+
+
+@fragment
+def render_exploitation(data):
+    df = data['exploitation']
+    selection = yearly_selection('exploitation', df, charts.EXPLOITATION_COLUMNS)
+    show_figure('exploitation', lambda: charts.exploitation_figure(df, selection), selection)
+    show_figure('exploitation_taux', lambda: charts.execution_rates_figure(
+        charts.execution_totals(data, 'exploitation'), "Taux d'exécution - Exploitation"))
+
+
+@fragment
+def render_investment(data):
+    df = data['investissement']
+    selection = yearly_selection('investment', df, charts.INVESTMENT_COLUMNS)
+    show_figure('investment', lambda: charts.investment_figure(df, selection), selection)
+    show_figure('investment_taux', lambda: charts.execution_rates_figure(
+        charts.execution_totals(data, 'investissement'), "Taux d'exécution - Investissement"))
+
+
+@fragment
+def render_marches(data):
+    df = data['marches']
+    selection = yearly_selection('marches', df, charts.MARCHES_COLUMNS)
+    show_figure('marches', lambda: charts.marches_figure(df, selection), selection)
+
+
+@fragment
+def render_nature_exploit(data):
+    df = data['achat_nature_exploit']
+    selection = yearly_selection('nature_exploit', df, charts.ACHAT_NATURE_COLUMNS)
+    show_figure('nature_exploit', lambda: charts.nature_exploit_figure(df, selection), selection)
+
+
+@fragment
+def render_nature_invest(data):
+    df = data['achat_nature_invest']
+    selection = yearly_selection('nature_invest', df, charts.ACHAT_NATURE_COLUMNS)
+    show_figure('nature_invest', lambda: charts.nature_invest_figure(df, selection), selection)
+
+
+def render_achat_cdc(data):
+    show_figure('achat_cdc', lambda: charts.achat_cdc_figure(data['achat_cdc']))
+
+
+def render_synthese(data):
+    show_figure('synthese', lambda: charts.synthese_figure(data['synthese']))
+
+
+@fragment
+def render_recettes(data):
+    # Dernière année disponible pour chaque famille de recettes
+    recettes_all = charts.recettes_frame(data)
+
+    # Filtre sur les catégories, toutes sélectionnées par défaut
+    selected_categories = st.multiselect('Select Categories',
+        options=recettes_all['Category'].unique(),
+        default=recettes_all['Category'].unique()
+    )
+    filtered_data = recettes_all[recettes_all['Category'].isin(selected_categories)]
+    show_figure('recettes', lambda: charts.recettes_figure(filtered_data, recettes_all['Year'].max()),
+                tuple(selected_categories))
+
+
+# Sections de la vue Finance ; seule la première est ouverte au chargement
+FINANCE_SECTIONS = [
+    Section("Budget par source", render_budget_sources, families=['budget_source'], expanded=True, uses_kpis=True),
+    Section("Exploitation", render_exploitation, families=['exploitation']),
+    Section("Investissement", render_investment, families=['investissement']),
+    Section("Marchés pluriannuels", render_marches, families=['marches']),
+    Section("Achat marché par nature (exploitation)", render_nature_exploit, families=['achat_nature_exploit']),
+    Section("Achat marché par nature (investissement)", render_nature_invest, families=['achat_nature_invest']),
+    Section("Achat CDC par budget", render_achat_cdc, families=['achat_cdc']),
+    Section("Synthèse par type", render_synthese, families=['synthese']),
+    Section("Recettes", render_recettes,
+            families=['recettes_fonctionnement', 'recettes_investissement', 'recettes_propres']),
+]
+
+
+def render_rh_indicators(sheets):
+    # Indicateurs lus dans la table des indicateurs RH
+    table = get_kpis("Ressources humaines")
+    total_effectif = int(kpis.kpi_series(table, 'RH', 'Effectif total').sum())
+    par_genre = kpis.kpi_series(table, 'RH', 'Effectif par genre')
+    parts_genre = kpis.kpi_series(table, 'RH', 'Part par genre (%)')
+    total_hommes = int(par_genre.get('Homme', 0))
+    total_femmes = int(par_genre.get('Femme', 0))
+    pourcentage_hommes = parts_genre.get('Homme', 0)
+    pourcentage_femmes = parts_genre.get('Femme', 0)
+
+    st.markdown("<h1 style='text-align: left;'>Indicateurs Clés</h1>", unsafe_allow_html=True)
+
+    # Afficher les indicateurs dans des colonnes
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.info("Total Effectif", icon="📊")
+        st.metric(label="Total", value=total_effectif)
+
+    with col2:
+        st.info("Total Hommes", icon="👨")
+        st.metric(label="Nombre", value=total_hommes, delta=f"{pourcentage_hommes:.2f}%")
+
+    with col3:
+        st.info("Total Femmes", icon="👩")
+        st.metric(label="Nombre", value=total_femmes, delta=f"{pourcentage_femmes:.2f}%")
+
+
+@fragment
+def render_repart_grade(sheets):
+    repart_grade = sheets['Répartition par Grade']
+    # Visualiser "Répartition par Grade"
+    selected_categories = st.multiselect(
+        "Sélectionnez les catégories à afficher",
+        options=repart_grade['Catégorie'].unique(),
+        default=list(repart_grade['Catégorie'].unique())
+    )
+    filtered_data_grade = repart_grade[repart_grade['Catégorie'].isin(selected_categories)]
+    show_figure(
+        'grade', lambda: charts.grade_figure(filtered_data_grade), tuple(selected_categories)
+    )
+
+
+@fragment
+def render_repart_genre(sheets):
+    repart_genre = sheets['Répartition par genre']
+    # Visualiser "Répartition par Genre"
+    selected_genres = st.multiselect(
+        "Sélectionnez les genres à afficher",
+        options=repart_genre['Genre'].unique(),
+        default=list(repart_genre['Genre'].unique())
+    )
+    filtered_data_genre = repart_genre[repart_genre['Genre'].isin(selected_genres)]
+    show_figure(
+        'genre', lambda: charts.genre_figure(filtered_data_genre), tuple(selected_genres)
+    )
+
+
+@fragment
+def render_repart_age(sheets):
+    repart_age = sheets['Répartition par Age']
+    # Visualiser "Répartition par Tranche d'Âge"
+    selected_age_ranges = st.multiselect(
+        "Sélectionnez les tranches d'âge à afficher",
+        options=repart_age["tranche d'âge"].unique(),
+        default=list(repart_age["tranche d'âge"].unique())
+    )
+    filtered_data_age = repart_age[repart_age["tranche d'âge"].isin(selected_age_ranges)]
+    show_figure(
+        'age', lambda: charts.age_figure(filtered_data_age), tuple(selected_age_ranges)
+    )
+
+
+def render_repart_departement(sheets):
+    show_figure(
+        'departement', lambda: charts.departement_figure(sheets['Répartition par Département'])
+    )
+
+
+def render_repart_division(sheets):
+    show_figure(
+        'division', lambda: charts.division_figure(sheets['Repartition par Division'])
+    )
+
+
+def render_disponibilite(sheets):
+    show_figure(
+        'disponibilite', lambda: charts.disponibilite_figure(sheets['Mise en disponibilité'])
+    )
+
+
+def render_mise_disposition(sheets):
+    show_figure(
+        'mise_disposition', lambda: charts.mise_disposition_figure(sheets['Mise à la disposistion'])
+    )
+
+
+def render_detachements(sheets):
+    show_figure('detachements', lambda: charts.detachements_figure(sheets['Détéchements']))
+
+
+def render_promotions(sheets):
+    show_figure('promotions', lambda: charts.promotions_figure(sheets['Promotions']))
+
+
+def render_stages(sheets):
+    show_figure('stages', lambda: charts.stages_figure(sheets['Stages']))
+
+
+def render_mutation(sheets):
+    show_figure('mutation', lambda: charts.mutation_figure(sheets['Mutation permutation']))
+
+
+def render_retraite(sheets):
+    show_figure('retraite', lambda: charts.retraite_figure(sheets['Retraite par grade']))
+
+
+def render_recrutement(sheets):
+    show_figure(
+        'recrutement', lambda: charts.recrutement_figure(sheets['Recrutment depuis 2015'])
+    )
+
+
+def render_diplome(sheets):
+    show_figure(
+        'diplome', lambda: charts.diplome_figure(sheets['Repartition par diplome'])
+    )
+
+
+# Sections de la vue Ressources humaines ; seuls les indicateurs sont ouverts au chargement
+RH_SECTIONS = [
+    Section("Indicateurs clés", render_rh_indicators, expanded=True, uses_kpis=True),
+    Section("Répartition par Grade", render_repart_grade, sheet_names=['Répartition par Grade']),
+    Section("Répartition par Genre", render_repart_genre, sheet_names=['Répartition par genre']),
+    Section("Répartition par Tranche d'Âge", render_repart_age, sheet_names=['Répartition par Age']),
+    Section("Répartition par Département", render_repart_departement, sheet_names=['Répartition par Département']),
+    Section("Répartition par Division", render_repart_division, sheet_names=['Repartition par Division']),
+    Section("Mise en Disponibilité", render_disponibilite, sheet_names=['Mise en disponibilité']),
+    Section("Mise à la Disposition", render_mise_disposition, sheet_names=['Mise à la disposistion']),
+    Section("Détachements", render_detachements, sheet_names=['Détéchements']),
+    Section("Promotions", render_promotions, sheet_names=['Promotions']),
+    Section("Répartition des Stages", render_stages, sheet_names=['Stages']),
+    Section("Mutations par Grade", render_mutation, sheet_names=['Mutation permutation']),
+    Section("Départs à la Retraite", render_retraite, sheet_names=['Retraite par grade']),
+    Section("Recrutement par Année", render_recrutement, sheet_names=['Recrutment depuis 2015']),
+    Section("Répartition des Diplômes", render_diplome, sheet_names=['Repartition par diplome']),
+]
+
+
+def section_jobs(section):
+    """Lectures en cours dont dépend la section : {feuille: tâche}, pour les feuilles pas encore lues.
+
+    Les feuilles non conformes ne sont pas lues : la section affichera son
+    erreur. Une tâche terminée ne fait plus attendre la section, même si sa
+    feuille a échoué ou n'est plus dans le magasin : ``load_sheets`` signale
+    l'erreur ou relit la feuille.
+    """
+    sections = [section]
+    if section.uses_kpis:
+        # Seuls les indicateurs des familles de la section (tous pour une section sans famille)
+        sections += kpi_sections(data_type, section.families or None)
+    names = []
+    for part in sections:
+        names += sheets_for(get_catalog(), part.sheet_names, part.families)
+    names = [name for name in dict.fromkeys(names) if is_valid([name])]
+    fingerprints = get_sheet_fingerprints()
+    jobs = sheet_jobs(names)
+    return {name: jobs[fingerprints[name]] for name in names
+            if fingerprints[name] in jobs and not jobs[fingerprints[name]].done()
+            and jobs[fingerprints[name]].status[fingerprints[name]] == PENDING}
+
+
+def show_progress(jobs):
+    # Progression par feuille des lectures dont dépend la section
+    status = {name: job.status[key] for job in set(jobs.values()) for name, key in job.sheet_keys.items()}
+    ready = sum(state == READY for state in status.values())
+    ids = ", ".join(sorted({job.id for job in jobs.values()}))
+    st.progress(ready / len(status), text=f"Lecture en arrière-plan ({ids}) : {ready}/{len(status)} feuilles prêtes")
+    st.caption(" · ".join(f"{name} : {state}" for name, state in sorted(status.items())))
+
+
+def render_sections(sections):
+    """Affiche chaque section ouverte dès que ses feuilles sont lues.
+
+    Chaque section a un interrupteur : ses feuilles ne sont lues que
+    lorsqu'elle est ouverte, puis restent dans le cache. Les lectures se
+    font en arrière-plan (jobs.py) ; en attendant, la section montre la
+    progression de ses feuilles et les sections déjà prêtes s'affichent.
+    Un emplacement est réservé pour chaque section afin de conserver
+    l'ordre de la page ; une section en erreur affiche son propre message
+    sans empêcher l'affichage des suivantes.
+    """
+    placeholders = []
+    for section in sections:
+        placeholder = st.empty()
+        placeholder.caption(f"Chargement : {section.title}…")
+        placeholders.append(placeholder)
+    waiting = []
+    for section, placeholder in zip(sections, placeholders):
+        with placeholder.container():
+            if st.checkbox(f"**{section.title}**", value=section.expanded, key=f"section_{section.title}"):
+                waiting.append((section, st.empty()))
+    followed = set()
+    while waiting:
+        pending = []
+        for section, body in waiting:
+            with body.container():
+                try:
+                    jobs = section_jobs(section)
+                    followed.update(jobs.values())
+                    if jobs:
+                        show_progress(jobs)
+                        pending.append((section, body, jobs))
+                        continue
+                    section.render(load_section(section))
+                    if section.families:
+                        # Indicateurs des familles affichées, pour l'export : leurs feuilles sont déjà lues
+                        get_kpis(data_type, section.families)
+                except Exception as e:
+                    st.error(f"{section.title} : une erreur est survenue : {e}")
+        waiting = [(section, body) for section, body, _ in pending]
+        if pending:
+            wait_jobs({job for _, _, jobs in pending for job in jobs.values()}, timeout=JOB_POLL_SECONDS)
+    record_jobs(followed)
+
+
+if uploaded_file is not None:
+    # Noms, empreintes et en-têtes des feuilles : un fichier illisible (classeur
+    # endommagé, .xls sans xlrd...) est signalé sans afficher le reste de la page
     try:
-        # Lecture des données RH
-        excel_data = pd.ExcelFile(uploaded_file)
-            # Charger les données RH
-        repart_grade = pd.read_excel(excel_data, sheet_name='Répartition par Grade')
-        repart_genre = pd.read_excel(excel_data, sheet_name='Répartition par genre')
-        repart_age = pd.read_excel(excel_data, sheet_name='Répartition par Age')
-        repart_departement = pd.read_excel(excel_data, sheet_name='Répartition par Département') 
-        repart_division = pd.read_excel(excel_data, sheet_name='Repartition par Division') 
-        df_disponibilite = pd.read_excel(excel_data, sheet_name='Mise en disponibilité')  
-        df_mise_disposition = pd.read_excel(excel_data, sheet_name='Mise à la disposistion') 
-        df_detachements = pd.read_excel(excel_data, sheet_name='Détéchements')  
-        df_promotions = pd.read_excel(excel_data, sheet_name='Promotions') 
-        df_stages = pd.read_excel(excel_data ,sheet_name='Stages')
-        df_mutation = pd.read_excel(excel_data ,sheet_name='Mutation permutation')
-        df_retraite_grade = pd.read_excel(excel_data , sheet_name='Retraite par grade')
-        df_recrutment = pd.read_excel(excel_data , sheet_name='Recrutment depuis 2015')
-        df_diplome = pd.read_excel(excel_data ,sheet_name='Repartition par diplome')
-            # Calculer les indicateurs
-        total_effectif = repart_grade['Nombre'].sum()
-        total_hommes = repart_genre[repart_genre['Genre'] == 'Homme']['Nombre'].sum()
-        total_femmes = repart_genre[repart_genre['Genre'] == 'Femme']['Nombre'].sum()
-        pourcentage_hommes = (total_hommes / total_effectif) * 100
-        pourcentage_femmes = (total_femmes / total_effectif) * 100
-            # Ajouter une section avec le logo comme icône avant le titre
-        
-        st.markdown("<h1 style='text-align: left;'>Indicateurs Clés</h1>", unsafe_allow_html=True)
-
-            # Afficher les indicateurs dans des colonnes
-        col1, col2, col3 = st.columns(3)
-
-        with col1:
-                st.info("Total Effectif", icon="📊")
-                st.metric(label="Total", value=total_effectif)
-
-        with col2:
-                st.info("Total Hommes", icon="👨")
-                st.metric(label="Nombre", value=total_hommes, delta=f"{pourcentage_hommes:.2f}%")
-
-        with col3:
-                st.info("Total Femmes", icon="👩")
-                st.metric(label="Nombre", value=total_femmes, delta=f"{pourcentage_femmes:.2f}%")
-             
-            # Visualiser "Répartition par Grade"
-        selected_categories = st.multiselect(
-                "Sélectionnez les catégories à afficher",
-                options=repart_grade['Catégorie'].unique(),
-                default=list(repart_grade['Catégorie'].unique())
-            )
-        filtered_data_grade = repart_grade[repart_grade['Catégorie'].isin(selected_categories)]
-        fig_grade = px.bar(
-                filtered_data_grade,
-                x='Catégorie',
-                y='Nombre',
-                color='Pourcentage %',
-                title="Répartition par Grade"
-            )
-        st.plotly_chart(fig_grade)
-
-            # Visualiser "Répartition par Genre"
-        selected_genres = st.multiselect(
-                "Sélectionnez les genres à afficher",
-                options=repart_genre['Genre'].unique(),
-                default=list(repart_genre['Genre'].unique())
-            )
-        filtered_data_genre = repart_genre[repart_genre['Genre'].isin(selected_genres)]
-        fig_genre = px.pie(
-                filtered_data_genre,
-                names='Genre',
-                values='Nombre',
-                title="Répartition par Genre",
-                hover_data=['Pourcentage %'],
-                labels={'Pourcentage %': '% de Genre'}
-            )
-        st.plotly_chart(fig_genre)
-
-            # Visualiser "Répartition par Tranche d'Âge"
-        selected_age_ranges = st.multiselect(
-                "Sélectionnez les tranches d'âge à afficher",
-                options=repart_age["tranche d'âge"].unique(),
-                default=list(repart_age["tranche d'âge"].unique())
-            )
-        filtered_data_age = repart_age[repart_age["tranche d'âge"].isin(selected_age_ranges)]
-        fig_age = px.bar(
-                filtered_data_age,
-                x="tranche d'âge",
-                y='Effectif',
-                color='%',
-                title="Répartition par Tranche d'Âge"
-            )
-        st.plotly_chart(fig_age)
-
-            # Visualiser "Répartition par Département"
-        st.subheader("Répartition par Département")
-        fig_departement = px.pie(
-            repart_departement, 
-            names='Entité', 
-            values='nombre du personnel', 
-            title="Répartition par Département",
-            labels={'nombre du personnel': 'Nombre du Personnel'}
-        )
-        st.plotly_chart(fig_departement)
-            # Visualiser "Répartition par Division"
-        st.subheader("Répartition par Division")
-        fig_division = px.bar(
-            repart_division, 
-            x='Divisions', 
-            y='Effectifs', 
-            color='%',
-            title="Répartition par Division",
-            labels={'Effectifs': 'Effectifs', 'Divisions': 'Division'}
-        )
-        st.plotly_chart(fig_division)
-        # Visualiser "Mise en Disponibilité"
-        st.subheader("Mise en Disponibilité")
-        fig_disponibilite = px.scatter(
-            df_disponibilite, 
-            x='Grade', 
-            y='Unité', 
-            color='Motif',
-            title="Mise en Disponibilité",
-            labels={'Grade': 'Grade', 'Unité': 'Unité'}
-        )
-        st.plotly_chart(fig_disponibilite)
-        # Visualiser "Mise à la Disposition"
-        st.subheader("Mise à la Disposition")
-        fig_mise_disposition = px.scatter(
-            df_mise_disposition, 
-            x='Grade ', 
-            y='Unité', 
-            color="Administration d'accueil",
-            title="Mise à la Disposition",
-            labels={'Grade ': 'Grade', 'Unité': 'Unité'}
-        )
-        st.plotly_chart(fig_mise_disposition)
-        # Visualiser "Détachements"
-        st.subheader("Détachements")
-        fig_detachements = px.scatter(
-            df_detachements, 
-            x='Grade', 
-            y='Unité', 
-            color="Administration d'accueil",
-            title="Détachements",
-            labels={'Grade': 'Grade', 'Unité': 'Unité'}
-        )
-        st.plotly_chart(fig_detachements)
-        # Visualiser "Promotions"
-        st.subheader("Promotions")
-        df_promotions_long = df_promotions.melt(
-            id_vars=['Cadre'], 
-            value_vars=['Promotion de grade', 'Avancement d’échelon', 'Notation', 'Titularisation'],
-            var_name='Type de Promotion', 
-            value_name='Nombre'
-        )
-        fig_promotions = px.bar(
-            df_promotions_long, 
-            x='Cadre', 
-            y='Nombre', 
-            color='Type de Promotion',
-            title="Distribution des Promotions par Cadre"
-        )
-        st.plotly_chart(fig_promotions)
-        # Visualisation pour "Répartition des Stages"
-        df_stages_long = df_stages.melt(var_name='Stage', value_name='Nombre')
-        df_stages_long = df_stages_long[df_stages_long['Stage'].str.contains('Unnamed') == False]
-        fig_stages = px.bar(df_stages_long, x='Stage', y='Nombre', 
-                    title="Répartition des Stages",
-                    labels={'Stage': 'Stage', 'Nombre': 'Nombre'})
-        st.plotly_chart(fig_stages)
-
-         # Visualisation pour "Mutations par Grade"
-        fig_mutation = px.bar(df_mutation, x='Grade', title="Mutations par Grade",
-                      labels={'Grade': 'Grade', 'Unnamed: 0': 'Nombre'})
-        st.plotly_chart(fig_mutation)
-        # Visualisation pour "Départs à la Retraite par Catégorie"
-        fig_retraite_grade = px.bar(df_retraite_grade, x='Catégorie', y=' Départs à la retraite',
-                           title="Départs à la Retraite par Catégorie",
-                           labels={'Catégorie': 'Catégorie', ' Départs à la retraite': 'Départs à la Retraite'})
-        st.plotly_chart(fig_retraite_grade)
-        # Visualisation pour "Recrutement par Année"
-        fig_recrutment = px.line(df_recrutment, x='ANNEE', y='NOMBRE', color='CADRE',
-                            title="Recrutement par Année",
-                            labels={'ANNEE': 'Année', 'NOMBRE': 'Nombre de Recrutements', 'CADRE': 'Cadre'})
-        st.plotly_chart(fig_recrutment)
-        # Visualisation pour "Répartition des Diplômes"
-        df_diplome_long = df_diplome.melt(var_name='Diplôme', value_name='Nombre')
-        df_diplome_long = df_diplome_long.dropna()
-        fig_diplome = px.pie(df_diplome_long, names='Diplôme', values='Nombre',
-                        title="Répartition des Diplômes",
-                        labels={'Nombre': 'Nombre', 'Diplôme': 'Diplôme'})
-        st.plotly_chart(fig_diplome)
+        get_sheet_names()
+        get_sheet_fingerprints()
+        missing_columns = get_missing_columns()
     except Exception as e:
-            st.error(f"Une erreur est survenue lors du traitement des données RH : {e}")
+        st.error(f"Impossible de lire le fichier « {uploaded_file.name} » : {e}")
+        st.stop()
+    if missing_columns:
+        # Contrôle des en-têtes : signalé avant l'ouverture des sections concernées
+        st.sidebar.warning("Feuilles non conformes : " + describe_missing(missing_columns))
+
+if uploaded_file is None:
+    # Rien à afficher tant qu'aucun fichier n'est chargé
+    pass
+elif data_type == "Finance" and is_csv:
+    st.info("Un export CSV du personnel alimente la vue Ressources humaines.")
+
+elif data_type == "Finance":
+    render_sections(FINANCE_SECTIONS)
+
+elif data_type == "Ressources humaines" and is_csv:
+    # Seules les répartitions calculables depuis l'export sont proposées
+    render_sections([section for section in RH_SECTIONS
+                     if all(name in get_sheet_names() for name in section.sheet_names)])
+
+elif data_type == "Ressources humaines":
+    render_sections(RH_SECTIONS)
+
+# Export de la table des indicateurs déjà calculée pour la vue affichée
+if uploaded_file is not None and kpis_ready(data_type):
+    st.sidebar.download_button(
+        "Exporter les indicateurs (CSV)",
+        get_kpis(data_type).to_csv(index=False).encode('utf-8'),
+        file_name=f"indicateurs_{data_type}.csv",
+        mime="text/csv"
+    )
 
-             
+# Temps et mémoire de la dernière lecture du classeur
+if st.session_state.get('load_stats'):
+    with st.sidebar.expander("Chargement des feuilles"):
+        st.dataframe(pd.DataFrame(list(st.session_state['load_stats'].values())))
+        store = shared_store()
+        st.caption(f"Magasin partagé : {len(store)} tables, {store.nbytes / 1024 ** 2:.1f} Mo, "
+                   f"{store.sessions()} session(s)")
+
+# Dernière mesure de chaque étape, exportable pour comparer des classeurs
+if instrumentation and get_recorder().steps:
+    with st.sidebar.expander("Mesures de performance"):
+        recorder = get_recorder()
+        steps = pd.DataFrame(recorder.latest())
+        st.dataframe(steps.sort_values('seconds', ascending=False), hide_index=True)
+        st.caption("Total par type d'étape (s)")
+        st.dataframe(steps.groupby('kind')['seconds'].sum())
+        st.download_button("Exporter (JSON)", recorder.to_json().encode('utf-8'),
+                           file_name="mesures.json", mime="application/json")
+        st.download_button("Exporter (Prometheus)", recorder.to_prometheus().encode('utf-8'),
+                           file_name="mesures.prom", mime="text/plain")
@@ -0,0 +1,158 @@
+"""Génération hors ligne des tableaux de bord pour un répertoire de classeurs.
+
+Réutilise le chargement (catalogue, instantanés) et les graphiques de
+l'application Streamlit. Pour chaque classeur, écrit dans
+``<sortie>/<nom du classeur>/`` un fichier HTML et/ou JSON Plotly par
+graphique, la table des indicateurs (``indicateurs.csv``) et un résumé
+(``resume.json``).
+
+Exemple :
+    python batch.py classeurs/ --output rapports/ --workers 4
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import charts
+import kpis
+from cache import content_hash
+from catalog import build_catalog, list_sheet_names, section_data, sheet_fingerprints, sheets_for
+from loader import read_headers
+from schema import check_headers, describe_missing, expected_columns
+from snapshot import read_with_snapshots
+
+VIEWS = {
+    'Finance': charts.FINANCE_FIGURES,
+    'Ressources humaines': charts.RH_FIGURES,
+}
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xls')
+
+
+def available_figures(specs, sheet_names, catalog):
+    """Graphiques dont toutes les feuilles et familles sont présentes dans le classeur."""
+    return [spec for spec in specs
+            if all(name in sheet_names for name in spec.sheet_names)
+            and all(family in catalog for family in spec.families)]
+
+
+def process_workbook(path, output_dir, views, formats):
+    """Produit les graphiques et les indicateurs d'un classeur et retourne son résumé."""
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        source = io.BytesIO(f.read())
+    file_key = content_hash(source)
+    sheet_names = list_sheet_names(source.getvalue())
+    catalog = build_catalog(sheet_names)
+
+    # En-têtes vérifiés avant toute lecture complète
+    expected = expected_columns(catalog, sheet_names)
+    missing = check_headers(read_headers(source, list(expected)), expected)
+
+    summary = {'fichier': path, 'empreinte': file_key, 'graphiques': [], 'erreurs': {}}
+    specs = []
+    for spec in (spec for view in views for spec in available_figures(VIEWS[view], sheet_names, catalog)):
+        spec_missing = {name: missing[name] for name in sheets_for(catalog, spec.sheet_names, spec.families)
+                        if name in missing}
+        if spec_missing:
+            summary['erreurs'][spec.name] = describe_missing(spec_missing)
+        else:
+            specs.append(spec)
+    # Indicateurs des seules vues demandées
+    finance_families = [family for family in kpis.FINANCE_FAMILIES
+                        if 'Finance' in views and family in catalog
+                        and not any(name in missing for name in catalog[family].values())]
+    rh_sheets = [name for name in kpis.RH_SHEETS
+                 if 'Ressources humaines' in views and name in sheet_names and name not in missing]
+
+    # Toutes les feuilles utiles sont lues en une seule passe
+    needed = sheets_for(catalog, families=finance_families) + rh_sheets
+    for spec in specs:
+        needed += sheets_for(catalog, spec.sheet_names, spec.families)
+    fingerprints = sheet_fingerprints(source.getvalue(), sheet_names)
+    sheets, _ = read_with_snapshots(source, {name: fingerprints[name] for name in dict.fromkeys(needed)})
+
+    target = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0])
+    os.makedirs(target, exist_ok=True)
+    for spec in specs:
+        try:
+            fig = spec.build(section_data(catalog, sheets, spec.sheet_names, spec.families))
+            if 'html' in formats:
+                fig.write_html(os.path.join(target, f'{spec.name}.html'), include_plotlyjs='cdn')
+            if 'json' in formats:
+                fig.write_json(os.path.join(target, f'{spec.name}.json'))
+            summary['graphiques'].append(spec.name)
+        except Exception as e:
+            summary['erreurs'][spec.name] = str(e)
+
+    tables = []
+    if 'Finance' in views:
+        tables.append(kpis.finance_kpis(section_data(catalog, sheets, families=finance_families)))
+    if 'Ressources humaines' in views:
+        tables.append(kpis.rh_kpis({name: sheets[name] for name in rh_sheets}))
+    indicators = pd.concat(tables, ignore_index=True)
+    indicators.to_csv(os.path.join(target, 'indicateurs.csv'), index=False)
+
+    summary['indicateurs'] = len(indicators)
+    summary['secondes'] = round(time.perf_counter() - start, 3)
+    with open(os.path.join(target, 'resume.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def _process_safely(path, output_dir, views, formats):
+    # Un classeur illisible ne doit pas interrompre le traitement des autres
+    try:
+        return process_workbook(path, output_dir, views, formats)
+    except Exception as e:
+        return {'fichier': path, 'echec': str(e)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-calcule les tableaux de bord d'un répertoire de classeurs.")
+    parser.add_argument('input_dir', help="répertoire contenant les classeurs .xlsx/.xls")
+    parser.add_argument('--output', default='rapports', help="répertoire de sortie (défaut : rapports)")
+    parser.add_argument('--view', choices=list(VIEWS), action='append',
+                        help="vue à produire, répétable (défaut : toutes)")
+    parser.add_argument('--format', choices=['html', 'json'], action='append', dest='formats',
+                        help="format des graphiques, répétable (défaut : html et json)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="nombre de classeurs traités en parallèle (défaut : nombre de cœurs)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    views = args.view or list(VIEWS)
+    formats = args.formats or ['html', 'json']
+    paths = sorted(
+        os.path.join(args.input_dir, name) for name in os.listdir(args.input_dir)
+        if name.lower().endswith(WORKBOOK_EXTENSIONS) and not name.startswith('~$')
+    )
+    os.makedirs(args.output, exist_ok=True)
+
+    jobs = [(path, args.output, views, formats) for path in paths]
+    if args.workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            summaries = list(pool.map(_process_safely, *zip(*jobs)))
+    else:
+        summaries = [_process_safely(*job) for job in jobs]
+
+    for summary in summaries:
+        if 'echec' in summary:
+            print(f"ÉCHEC {summary['fichier']} : {summary['echec']}", file=sys.stderr)
+        else:
+            print(f"{summary['fichier']} : {len(summary['graphiques'])} graphiques, "
+                  f"{len(summary['erreurs'])} erreurs, {summary['secondes']} s")
+    with open(os.path.join(args.output, 'resume.json'), 'w', encoding='utf-8') as f:
+        json.dump(summaries, f, ensure_ascii=False, indent=2)
+    return 1 if any('echec' in summary for summary in summaries) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
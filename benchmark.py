@@ -0,0 +1,224 @@
+"""Mesure reproductible du chargement et du rendu sur des classeurs synthétiques.
+
+Génère des classeurs Finance et RH au format lu par l'application (noms de
+feuilles reconnus par catalog.py, colonnes du registre schema.py), de
+quelques lignes à plus de 100 000 lignes par feuille et de 2 à 12 années,
+puis chronomètre chaque étape sans interface :
+
+- lecture : ouverture du classeur, lecture et normalisation des feuilles ;
+- transformation : empilement des années et table des indicateurs ;
+- figure : construction des graphiques (registres de charts.py) ;
+- sérialisation : conversion des figures en JSON, comme pour le navigateur.
+
+Les classeurs générés sont conservés dans ``--data`` et réutilisés d'une
+exécution à l'autre (même graine, mêmes données). Avec ``--baseline``, les
+durées sont comparées à une exécution précédente enregistrée par
+``--output``.
+
+Exemple :
+    python benchmark.py --scale tiny --scale medium --output mesures.json
+    python benchmark.py --scale medium --baseline mesures.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly
+
+import charts
+import kpis
+from batch import available_figures
+from cache import frame_nbytes
+from catalog import build_catalog, parse_sheet_name, section_data, sheets_for
+from loader import read_sheets
+from schema import COLUMN_TYPES, FAMILY_SCHEMAS, SHEET_SCHEMAS
+
+# Taille des classeurs : (lignes par feuille, nombre d'années)
+SCALES = {
+    'tiny': (10, 2),
+    'small': (1_000, 3),
+    'medium': (10_000, 5),
+    'large': (100_000, 3),
+    'many-years': (1_000, 12),
+}
+
+# Nom des feuilles annuelles générées, par famille (voir catalog.FAMILY_PATTERNS)
+FAMILY_SHEETS = {
+    'budget_source': 'Budget_CNRST_Source_{year}',
+    'exploitation': 'Exploitation {year}',
+    'investissement': 'Investissement {year}',
+    'marches': 'Marchés Pluriannuel {year}',
+    'achat_nature_exploit': 'Achat Marché nature_Exploit{year}',
+    'achat_nature_invest': 'Achat Marché nature Invisti{year}',
+    'achat_cdc': 'Achat CDC par Budget {year}',
+    'synthese': 'Synthese par type {year}',
+    'recettes_fonctionnement': 'Recettes_Fonctionnement_{year}',
+    'recettes_investissement': 'Recettes_Invistissement_{year}',
+    'recettes_propres': 'RecettesPropres{year}',
+}
+
+# Colonnes facultatives du registre, utilisées par les graphiques
+EXTRA_COLUMNS = {
+    'recettes_propres': ['Désignation'],
+}
+
+# Feuilles RH sans en-têtes imposés, lues colonne par colonne
+FREE_SHEETS = {
+    'Stages': ['Stage de formation', 'Stage de perfectionnement', 'Stage à l’étranger'],
+    'Repartition par diplome': ['Doctorat', 'Master', 'Licence', 'Baccalauréat'],
+}
+
+# Valeurs imposées pour les libellés lus par les indicateurs et les graphiques
+FIXED_LABELS = {
+    'Source': list(charts.BUDGET_SOURCES),
+    'Genre': ['Homme', 'Femme'],
+}
+
+STAGES = ['lecture', 'transformation', 'figure', 'sérialisation']
+FIRST_YEAR = 2015
+
+
+def _column(rng, column, rows):
+    kind = COLUMN_TYPES.get(column, 'montant')
+    if kind == 'libelle':
+        labels = FIXED_LABELS.get(column) or [f'{column} {i}' for i in range(max(5, rows // 10))]
+        return rng.choice(labels, rows)
+    if kind == 'nombre':
+        return rng.integers(0, 500, rows)
+    if kind == 'pourcentage':
+        return rng.random(rows).round(4) * 100
+    return (rng.random(rows) * 1e7).round(2)
+
+
+def _frame(rng, columns, rows):
+    return pd.DataFrame({column: _column(rng, column, rows) for column in columns})
+
+
+def generate_sheets(rows, years, seed=0):
+    """Feuilles Finance et RH synthétiques : {nom de feuille: DataFrame}."""
+    rng = np.random.default_rng(seed)
+    sheets = {}
+    for family, template in FAMILY_SHEETS.items():
+        for year in range(FIRST_YEAR, FIRST_YEAR + years):
+            name = template.format(year=year)
+            assert parse_sheet_name(name) == (family, year), name
+            sheets[name] = _frame(rng, EXTRA_COLUMNS.get(family, []) + FAMILY_SCHEMAS[family], rows)
+    for name, columns in SHEET_SCHEMAS.items():
+        sheets[name] = _frame(rng, columns, rows)
+    for name, columns in FREE_SHEETS.items():
+        sheets[name] = _frame(rng, columns, rows)
+    return sheets
+
+
+def workbook_path(data_dir, scale, seed=0):
+    """Chemin du classeur de la taille ``scale``, généré s'il n'existe pas encore."""
+    rows, years = SCALES[scale]
+    path = os.path.join(data_dir, f'{scale}-{rows}x{years}-seed{seed}.xlsx')
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp.xlsx'
+        with pd.ExcelWriter(tmp_path) as writer:
+            for name, df in generate_sheets(rows, years, seed).items():
+                df.to_excel(writer, sheet_name=name, index=False)
+        os.replace(tmp_path, path)
+    return path
+
+
+def run_pipeline(path):
+    """Exécute une fois toute la chaîne sur un classeur et retourne {étape: (secondes, lignes, octets)}."""
+    results = {}
+    with pd.ExcelFile(path) as excel:
+        sheet_names = list(excel.sheet_names)
+    catalog = build_catalog(sheet_names)
+    specs = (available_figures(charts.FINANCE_FIGURES, sheet_names, catalog)
+             + available_figures(charts.RH_FIGURES, sheet_names, catalog))
+    needed = []
+    for spec in specs:
+        needed += sheets_for(catalog, spec.sheet_names, spec.families)
+    needed = list(dict.fromkeys(needed))
+
+    start = time.perf_counter()
+    sheets, stats = read_sheets(path, needed, workers=1)
+    results['lecture'] = (time.perf_counter() - start, sum(s.rows for s in stats), sum(s.nbytes for s in stats))
+
+    start = time.perf_counter()
+    inputs = [section_data(catalog, sheets, spec.sheet_names, spec.families) for spec in specs]
+    finance = kpis.finance_kpis(section_data(catalog, sheets, families=kpis.FINANCE_FAMILIES))
+    rh = kpis.rh_kpis({name: sheets[name] for name in kpis.RH_SHEETS})
+    rows = sum(len(df) for data in inputs for df in data.values())
+    nbytes = sum(frame_nbytes(df) for data in inputs for df in data.values())
+    results['transformation'] = (time.perf_counter() - start, rows + len(finance) + len(rh), nbytes)
+
+    start = time.perf_counter()
+    figures = [spec.build(data) for spec, data in zip(specs, inputs)]
+    results['figure'] = (time.perf_counter() - start, len(figures), 0)
+
+    start = time.perf_counter()
+    payloads = [fig.to_json() for fig in figures]
+    results['sérialisation'] = (time.perf_counter() - start, len(payloads), sum(len(p) for p in payloads))
+    return results
+
+
+def benchmark(scale, data_dir, repeat):
+    """Médiane des durées de chaque étape sur ``repeat`` exécutions."""
+    path = workbook_path(data_dir, scale)
+    runs = [run_pipeline(path) for _ in range(repeat)]
+    rows, years = SCALES[scale]
+    records = []
+    for stage in STAGES:
+        _, count, nbytes = runs[-1][stage]
+        records.append({
+            'scale': scale, 'rows_per_sheet': rows, 'years': years, 'stage': stage,
+            'seconds': statistics.median(run[stage][0] for run in runs),
+            'rows': count, 'bytes': nbytes, 'repeat': repeat,
+        })
+    return records
+
+
+def environment():
+    return {'python': platform.python_version(), 'pandas': pd.__version__, 'plotly': plotly.__version__,
+            'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Chronomètre la chaîne de traitement sur des classeurs synthétiques.")
+    parser.add_argument('--scale', choices=list(SCALES), action='append',
+                        help="taille des classeurs, répétable (défaut : tiny et small)")
+    parser.add_argument('--repeat', type=int, default=3, help="exécutions par taille (défaut : 3, médiane retenue)")
+    parser.add_argument('--data', default='.benchmarks', help="répertoire des classeurs générés (défaut : .benchmarks)")
+    parser.add_argument('--output', help="fichier JSON où enregistrer les résultats")
+    parser.add_argument('--baseline', help="résultats JSON d'une exécution précédente, pour comparaison")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    records = []
+    for scale in args.scale or ['tiny', 'small']:
+        records += benchmark(scale, args.data, args.repeat)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = {(r['scale'], r['stage']): r['seconds'] for r in json.load(f)['results']}
+
+    print(f"{'taille':<12}{'étape':<16}{'secondes':>10}{'lignes':>12}{'octets':>14}{'/ référence':>13}")
+    for r in records:
+        reference = baseline.get((r['scale'], r['stage']))
+        ratio = f"{r['seconds'] / reference:.2f}x" if reference else ''
+        print(f"{r['scale']:<12}{r['stage']:<16}{r['seconds']:>10.3f}{r['rows']:>12}{r['bytes']:>14}{ratio:>13}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'results': records}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import hashlib
+import itertools
+import os
+import threading
+import weakref
+from collections import Counter, OrderedDict
+
+import pandas as pd
+
+# Plafond mémoire par défaut du cache des feuilles (512 Mo)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Plafond mémoire du magasin partagé par toutes les sessions du serveur (1 Go)
+SHARED_MAX_BYTES = int(os.environ.get('DASHBOARD_SHARED_MAX_BYTES', 1024 * 1024 * 1024))
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+_lease_ids = itertools.count()
+
+
+def content_hash(uploaded_file):
+    """Empreinte SHA-256 du contenu du fichier téléchargé."""
+    return hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+
+
+def frame_nbytes(df):
+    """Taille mémoire réelle d'un DataFrame, chaînes comprises."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+class FrameCache:
+    """Cache LRU de DataFrames borné en mémoire.
+
+    Les clés sont les empreintes des feuilles (voir
+    ``catalog.sheet_fingerprints``). Les entrées les moins récemment
+    utilisées sont évincées dès que la taille totale dépasse ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Retourne une copie de la feuille en cache, ou None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # Copie : le code appelant ajoute des colonnes ('Year', 'Category'...)
+        return entry[0].copy()
+
+    def put(self, key, df):
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        size = frame_nbytes(df)
+        if size > self.max_bytes:
+            # Une feuille plus grande que le plafond n'est jamais conservée
+            return
+        self._entries[key] = (df, size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            self.nbytes -= self._entries.pop(self._victim())[1]
+
+    def _victim(self):
+        # Entrée la moins récemment utilisée
+        return next(iter(self._entries))
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+
+def _copy_on_write():
+    # Avec la copie à l'écriture (toujours active depuis pandas 3), une copie
+    # superficielle protège la feuille partagée de toute modification
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        return pd.get_option('mode.copy_on_write') is True
+    except (KeyError, pd.errors.OptionError):
+        return False
+
+
+class SharedStore(FrameCache):
+    """Cache de DataFrames commun à toutes les sessions du processus.
+
+    Les feuilles (et tables dérivées) d'un même contenu ne sont lues et
+    gardées qu'une fois, quel que soit le nombre d'utilisateurs. Chaque
+    session déclare les entrées qu'elle utilise (``acquire``) ; au-delà de
+    ``max_bytes``, les entrées qu'aucune session n'utilise sont évincées en
+    premier. Les entrées sont en lecture seule : ``get`` retourne une copie
+    qui partage les données tant qu'elle n'est pas modifiée (copie complète
+    si pandas n'a pas la copie à l'écriture).
+    """
+
+    def __init__(self, max_bytes=SHARED_MAX_BYTES):
+        super().__init__(max_bytes)
+        self.refs = Counter()
+        self._holders = {}
+        self._lock = threading.RLock()
+        self._shallow = _copy_on_write()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry[0].copy(deep=not self._shallow)
+
+    def put(self, key, df):
+        with self._lock:
+            super().put(key, df)
+
+    def _victim(self):
+        # Entrée la moins récemment utilisée parmi celles qu'aucune session ne tient
+        for key in self._entries:
+            if not self.refs[key]:
+                return key
+        return next(iter(self._entries))
+
+    def acquire(self, holder, keys):
+        """Enregistre que la session ``holder`` utilise les entrées ``keys``."""
+        with self._lock:
+            held = self._holders.setdefault(holder, set())
+            for key in keys:
+                if key not in held:
+                    held.add(key)
+                    self.refs[key] += 1
+
+    def release(self, holder):
+        """Libère toutes les entrées tenues par la session ``holder``."""
+        with self._lock:
+            for key in self._holders.pop(holder, ()):
+                self.refs[key] -= 1
+                if not self.refs[key]:
+                    del self.refs[key]
+
+    def sessions(self):
+        with self._lock:
+            return len(self._holders)
+
+
+class Lease:
+    """Entrées du magasin partagé utilisées par une session.
+
+    Conservé dans l'état de la session : quand la session se termine et que
+    l'objet est détruit, ses références sont libérées.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.holder = next(_lease_ids)
+        self.file_key = None
+        weakref.finalize(self, store.release, self.holder)
+
+    def hold(self, keys):
+        self.store.acquire(self.holder, keys)
+
+    def switch(self, file_key):
+        """Change de classeur : les entrées de l'ancien ne sont plus tenues par la session."""
+        if file_key != self.file_key:
+            self.store.release(self.holder)
+            self.file_key = file_key
+
+
+def shared_store():
+    """Magasin partagé du processus, créé au premier appel."""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = SharedStore()
+        return _shared_store
@@ -0,0 +1,169 @@
+import hashlib
+import io
+import re
+import unicodedata
+import zipfile
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+
+# Familles de feuilles annuelles, reconnues sur le nom normalisé (sans accents,
+# espaces ni ponctuation). Les motifs tolèrent les fautes présentes dans les
+# classeurs ('Invistissement', 'Invisti', 'Inves23'...). L'ordre compte : les
+# familles « Achat Marché ... Exploit » passent avant « Exploitation ».
+FAMILY_PATTERNS = [
+    ('achat_cdc', re.compile(r'^achatcdcparbudget')),
+    ('achat_nature_exploit', re.compile(r'^achatmarche.*nature.*exploit')),
+    ('achat_nature_invest', re.compile(r'^achatmarche.*nature.*inv')),
+    ('budget_source', re.compile(r'^budget.*source')),
+    ('exploitation', re.compile(r'^exploitation')),
+    ('investissement', re.compile(r'^inv[ei]stiss?ement')),
+    ('marches', re.compile(r'^marches?pluriannuels?')),
+    ('synthese', re.compile(r'^synthese.*type')),
+    ('recettes_fonctionnement', re.compile(r'^recettes?fonctionnement')),
+    ('recettes_investissement', re.compile(r'^recettes?inv')),
+    ('recettes_propres', re.compile(r'^recettes?propres?')),
+]
+
+# Année en fin de nom, sur quatre chiffres ('2023') ou deux ('Inves23')
+YEAR_PATTERN = re.compile(r'(20\d{2}|\d{2})$')
+
+_SPREADSHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_RELATIONSHIP_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+_PACKAGE_RELS_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Cellule texte d'une feuille : <c ... t="s"><v>index dans sharedStrings.xml</v></c>
+_SHARED_STRING_CELL = re.compile(rb'<(?:\w+:)?c\b[^>]*\bt="s"[^>]*>\s*<(?:\w+:)?v>(\d+)<')
+
+
+def normalize_name(name):
+    """Nom de feuille en minuscules, sans accents ni caractères non alphanumériques."""
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+
+def parse_sheet_name(name):
+    """Retourne (famille, année) pour une feuille annuelle connue, sinon None."""
+    normalized = normalize_name(name)
+    match = YEAR_PATTERN.search(normalized)
+    if match is None:
+        return None
+    year = int(match.group(1))
+    if year < 100:
+        year += 2000
+    stem = normalized[:match.start()]
+    for family, pattern in FAMILY_PATTERNS:
+        if pattern.match(stem):
+            return family, year
+    return None
+
+
+def list_sheet_names(data):
+    """Noms des feuilles du classeur, lus directement dans xl/workbook.xml.
+
+    Évite d'ouvrir le classeur complet ; les fichiers .xls (non zip) passent
+    par pd.ExcelFile.
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            root = ET.fromstring(archive.read('xl/workbook.xml'))
+        return [sheet.get('name') for sheet in root.iter(f'{_SPREADSHEET_NS}sheet')]
+    except (zipfile.BadZipFile, KeyError):
+        with pd.ExcelFile(io.BytesIO(data)) as excel:
+            return list(excel.sheet_names)
+
+
+def _sheet_parts(archive):
+    # {nom de feuille: chemin de sa partie XML dans l'archive}
+    root = ET.fromstring(archive.read('xl/workbook.xml'))
+    rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels.iter(f'{_PACKAGE_RELS_NS}Relationship')}
+    parts = {}
+    for sheet in root.iter(f'{_SPREADSHEET_NS}sheet'):
+        target = targets[sheet.get(_RELATIONSHIP_ID)]
+        parts[sheet.get('name')] = target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+    return parts
+
+
+def _shared_strings(archive):
+    try:
+        root = ET.fromstring(archive.read('xl/sharedStrings.xml'))
+    except KeyError:
+        return []
+    return [ET.tostring(item) for item in root.iter(f'{_SPREADSHEET_NS}si')]
+
+
+def sheet_fingerprints(data, sheet_names):
+    """Empreinte de chaque feuille, stable tant que son contenu ne change pas.
+
+    Pour un .xlsx, c'est le SHA-256 de la partie XML de la feuille et des
+    chaînes partagées qu'elle référence : modifier une feuille ne change pas
+    l'empreinte des autres. Pour un .xls (non zip), l'empreinte dépend du
+    fichier entier.
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            parts = _sheet_parts(archive)
+            strings = _shared_strings(archive)
+            fingerprints = {}
+            for name in sheet_names:
+                xml = archive.read(parts[name])
+                digest = hashlib.sha256(xml)
+                for index in _SHARED_STRING_CELL.findall(xml):
+                    digest.update(strings[int(index)])
+                fingerprints[name] = digest.hexdigest()
+            return fingerprints
+    except (zipfile.BadZipFile, KeyError, IndexError):
+        file_hash = hashlib.sha256(data).hexdigest()
+        return {name: hashlib.sha256(f'{file_hash}:{name}'.encode()).hexdigest() for name in sheet_names}
+
+
+def build_catalog(sheet_names):
+    """Regroupe les feuilles annuelles par famille : {famille: {année: feuille}}.
+
+    Les années sont triées ; si deux feuilles donnent la même famille et la
+    même année, la première dans l'ordre du classeur est retenue.
+    """
+    catalog = {}
+    for name in sheet_names:
+        parsed = parse_sheet_name(name)
+        if parsed is None:
+            continue
+        family, year = parsed
+        catalog.setdefault(family, {}).setdefault(year, name)
+    return {family: dict(sorted(years.items())) for family, years in catalog.items()}
+
+
+def combine_years(frames_by_year):
+    """Empile les feuilles d'une famille en un seul DataFrame avec une colonne 'Year'.
+
+    Les colonnes catégorielles le restent, avec l'union des catégories de
+    toutes les années.
+    """
+    combined = pd.concat(
+        [df.assign(Year=year) for year, df in frames_by_year.items()],
+        ignore_index=True
+    )
+    for column in combined.columns:
+        if any(isinstance(df[column].dtype, pd.CategoricalDtype)
+               for df in frames_by_year.values() if column in df.columns):
+            combined[column] = combined[column].astype('category')
+    return combined
+
+
+def sheets_for(catalog, sheet_names=(), families=()):
+    """Liste des feuilles à lire pour des feuilles nommées et des familles annuelles."""
+    names = list(sheet_names)
+    for family in families:
+        if family not in catalog:
+            raise KeyError(f"aucune feuille annuelle trouvée pour « {family} »")
+        names += catalog[family].values()
+    return names
+
+
+def section_data(catalog, sheets, sheet_names=(), families=()):
+    """Données passées aux graphiques : feuilles par nom et familles avec toutes leurs années empilées."""
+    data = {name: sheets[name] for name in sheet_names}
+    for family in families:
+        data[family] = combine_years({year: sheets[name] for year, name in catalog[family].items()})
+    return data
@@ -0,0 +1,504 @@
+import os
+from collections import namedtuple
+
+import pandas as pd
+import plotly.graph_objects as go
+
+# plotly.express est importé dans les fonctions qui l'utilisent : son import
+# est coûteux et inutile tant qu'aucun graphique RH n'est affiché
+
+import timeseries
+from schema import COLUMN_TYPES
+
+# Colonnes tracées par graphique
+EXPLOITATION_COLUMNS = ['Crédits ouverts  (A)', 'Engagements \n(B)', 'Paiements \n(C)']
+INVESTMENT_COLUMNS = ['Crédits ouverts Hors reports (A)', 'Engagements Hors Reports (B)', '% Engagement',
+                      'Paiements Hors Reports (C)', '% Paiement', 'Reports\nD= (B-C)', 'Disponible (A-B)']
+MARCHES_COLUMNS = ['Nombre de contrats', 'Montant en Dhs']
+ACHAT_NATURE_COLUMNS = ['Nombre de marché', 'Montant en Dhs']
+ACHAT_CDC_COLUMNS = ['Nombre de CDC', 'Montant en Dhs']
+
+# Au-delà de ce nombre de valeurs sur un axe, les moins importantes sont regroupées dans « Autres »
+MAX_CATEGORIES = int(os.environ.get('DASHBOARD_MAX_CATEGORIES', '30'))
+OTHERS_LABEL = 'Autres'
+
+# Nuages de points : tracés en WebGL au-delà de WEBGL_MIN_POINTS points, et
+# agrégés (un point par combinaison, taille = nombre de lignes) au-delà de SCATTER_MAX_POINTS lignes
+WEBGL_MIN_POINTS = int(os.environ.get('DASHBOARD_WEBGL_MIN_POINTS', '1000'))
+SCATTER_MAX_POINTS = int(os.environ.get('DASHBOARD_SCATTER_MAX_POINTS', '5000'))
+
+# Sources suivies sur le graphique d'évolution du budget, avec leur couleur
+BUDGET_SOURCES = {
+    "Budget général d'Etat (ministère de tutelle)": 'blue',
+    "FNSRSDT": 'green',
+    "Recettes propres": 'red'
+}
+
+
+def year_buttons(fig, years, title, all_years_label=None):
+    """Boutons du menu déroulant affichant les traces d'une seule année."""
+    buttons = []
+    if all_years_label:
+        buttons.append(dict(label=all_years_label,
+                            method="update",
+                            args=[{"visible": [True] * len(fig.data)},
+                                  {"title": title}]))
+    for year in years:
+        buttons.append(dict(label=str(year),
+                            method="update",
+                            args=[{"visible": [str(year) in trace.name for trace in fig.data]},
+                                  {"title": f"{title} - {year}"}]))
+    return buttons
+
+
+def compact_values(values):
+    """Valeurs arrondies au centime en float32 : charge utile réduite de moitié pour le navigateur."""
+    return pd.to_numeric(values, errors='coerce').round(2).to_numpy(dtype='float32')
+
+
+def _bucket(values, keep):
+    # Valeurs hors de ``keep`` remplacées par « Autres »
+    return values.astype(object).where(values.isin(keep), OTHERS_LABEL)
+
+
+def limit_categories(df, x, columns, max_categories=None):
+    """Garde les valeurs de ``x`` les plus importantes et regroupe les autres dans « Autres ».
+
+    L'importance d'une valeur est la somme de la première colonne de montant
+    (sinon de la première colonne). Les colonnes sont sommées par (année,
+    ``x``), sauf les pourcentages qui sont moyennés. Sans effet si ``x`` a
+    au plus ``max_categories`` valeurs ou si aucune colonne n'est demandée.
+    """
+    max_categories = max_categories or MAX_CATEGORIES
+    if not columns or df[x].nunique() <= max_categories:
+        return df
+    rank_column = next((c for c in columns if COLUMN_TYPES.get(c) == 'montant'), columns[0])
+    importance = pd.to_numeric(df[rank_column], errors='coerce').abs().groupby(df[x], observed=True).sum()
+    keep = list(importance.nlargest(max_categories - 1).index)
+    labels = _bucket(df[x], keep)
+    keys = [df['Year'], labels] if 'Year' in df.columns else [labels]
+    aggregations = {c: 'mean' if COLUMN_TYPES.get(c) == 'pourcentage' else 'sum' for c in columns}
+    grouped = df[columns].groupby(keys, sort=False).agg(aggregations).reset_index()
+    order = {label: i for i, label in enumerate(keep + [OTHERS_LABEL])}
+    return grouped.sort_values(x, key=lambda values: values.map(order), kind='stable')
+
+
+def category_scatter_figure(df, x, y, color, title, labels):
+    """Nuage de points sur deux axes catégoriels, borné quelle que soit la taille de la feuille.
+
+    Au-delà de ``SCATTER_MAX_POINTS`` lignes, les axes sont limités à leurs
+    ``MAX_CATEGORIES`` valeurs les plus fréquentes (plus « Autres ») et les
+    lignes identiques sont agrégées en un point dont la taille est leur
+    nombre. Au-delà de ``WEBGL_MIN_POINTS`` points, le tracé passe en WebGL.
+    """
+    import plotly.express as px
+
+    if len(df) > SCATTER_MAX_POINTS:
+        df = df[[x, y, color]].astype(object)
+        for column in (x, y):
+            keep = df[column].value_counts().index[:MAX_CATEGORIES - 1]
+            if df[column].nunique() > MAX_CATEGORIES:
+                df[column] = _bucket(df[column], keep)
+        df = df.groupby([x, y, color], dropna=False).size().reset_index(name='Nombre')
+        return px.scatter(df, x=x, y=y, color=color, size='Nombre', title=title, labels=labels,
+                          render_mode='webgl' if len(df) > WEBGL_MIN_POINTS else 'auto')
+    return px.scatter(df, x=x, y=y, color=color, title=title, labels=labels,
+                      render_mode='webgl' if len(df) > WEBGL_MIN_POINTS else 'auto')
+
+
+def yearly_bar_traces(df, x, columns, visible='legendonly', colors=None, compact=False):
+    """Une trace go.Bar par (année, colonne), en un seul passage groupby('Year').
+
+    ``visible`` est soit une valeur Plotly appliquée à toutes les traces, soit
+    une fonction de l'année. Avec ``compact``, les valeurs sont réduites par
+    ``compact_values``.
+    """
+    colors = colors or {}
+    traces = []
+    for year, df_year in df.groupby('Year', sort=True):
+        for column in columns:
+            traces.append(go.Bar(
+                x=df_year[x],
+                y=compact_values(df_year[column]) if compact else df_year[column],
+                name=f'{column} - {year}',
+                visible=visible(year) if callable(visible) else visible,
+                marker_color=colors.get(column)
+            ))
+    return traces
+
+
+def yearly_bar_figure(df, x, columns, title, menu_title=None, all_years_label=None,
+                      visible='legendonly', colors=None, selection=None, **layout):
+    """Graphique en barres par année, avec un menu de sélection d'année si ``menu_title`` est donné.
+
+    Les valeurs de ``x`` au-delà de ``MAX_CATEGORIES`` sont regroupées
+    (voir ``limit_categories``).
+
+    ``selection`` = (années, colonnes) active le mode allégé : le filtrage est
+    fait côté serveur, seules les traces choisies sont envoyées, toutes
+    visibles et sans menu.
+    """
+    if selection is not None:
+        years, columns = selection
+        df = limit_categories(df[df['Year'].isin(years)], x, list(columns))
+        fig = go.Figure(yearly_bar_traces(df, x, columns, visible=True, colors=colors, compact=True))
+        fig.update_layout(title=title, xaxis_title=x, **layout)
+        return fig
+    df = limit_categories(df, x, columns)
+    fig = go.Figure(yearly_bar_traces(df, x, columns, visible=visible, colors=colors))
+    if menu_title:
+        years = sorted(df['Year'].unique())
+        layout['updatemenus'] = [
+            dict(
+                type="dropdown",
+                showactive=True,
+                buttons=year_buttons(fig, years, menu_title, all_years_label=all_years_label)
+            )
+        ]
+    fig.update_layout(title=title, xaxis_title=x, **layout)
+    return fig
+
+
+def budget_sources_figure(budget_series):
+    # Une ligne par source suivie, lue dans la série (année, source) de timeseries.budget_series
+    fig = go.Figure()
+    dotations = budget_series['Dotation reçue'].unstack('Source')
+    evolutions = budget_series['Dotation reçue - évolution (%)'].unstack('Source')
+    for source, color in BUDGET_SOURCES.items():
+        if source not in dotations.columns:
+            continue
+        fig.add_trace(go.Scatter(
+            x=dotations.index,
+            y=dotations[source],
+            customdata=evolutions[source],
+            hovertemplate='%{x} : %{y:,.2f} Dhs<br>Évolution : %{customdata:.1f} %',
+            mode='lines+markers',  # Ajouter des marqueurs à chaque point de données
+            name=source,
+            line=dict(color=color, width=2)
+        ))
+    fig.update_layout(
+        title="Evolution de Budget Sources",
+        xaxis_title="Year",
+        yaxis_title="Dotation reçue",
+        legend_title="Source",
+        xaxis=dict(tickmode='linear'),
+    )
+    return fig
+
+
+def execution_rates_figure(totals, title):
+    # Taux d'engagement et de paiement par année, lus dans timeseries.execution_totals
+    fig = go.Figure()
+    for column in timeseries.RATE_COLUMNS:
+        fig.add_trace(go.Scatter(x=totals.index, y=totals[column], mode='lines+markers', name=column))
+    fig.update_layout(
+        title=title,
+        xaxis_title="Year",
+        yaxis_title="Taux (%)",
+        xaxis=dict(tickmode='linear'),
+    )
+    return fig
+
+
+def exploitation_figure(exploitation_all_years, selection=None):
+    return yearly_bar_figure(exploitation_all_years, 'Programme', EXPLOITATION_COLUMNS,
+                             title="Financial Data by Year", menu_title="Exploitation",
+                             selection=selection, yaxis_title="Value")
+
+
+def investment_figure(investment_all_years, selection=None):
+    return yearly_bar_figure(investment_all_years, 'Programme', INVESTMENT_COLUMNS,
+                             title="Investment Data by Year", menu_title="Investment Data",
+                             all_years_label="All Years", selection=selection, yaxis_title="Value")
+
+
+def marches_figure(marches_all_years, selection=None):
+    return yearly_bar_figure(marches_all_years, 'Objet', MARCHES_COLUMNS,
+                             title="Marchés Pluriannuel Data by Year", menu_title="Marchés Pluriannuel Data",
+                             selection=selection, yaxis_title="Value", barmode='group')
+
+
+def nature_exploit_figure(nature_combined, selection=None):
+    # Seule la première année est visible au chargement
+    first_year = nature_combined['Year'].min()
+    return yearly_bar_figure(nature_combined, 'Nature', ACHAT_NATURE_COLUMNS,
+                             title="Achat Marché Nature Exploit by Year", menu_title="Achat Marché Nature Exploit",
+                             visible=lambda year: bool(year == first_year), selection=selection,
+                             yaxis_title="Value", barmode='group', legend_title="Legend", xaxis_tickangle=-45)
+
+
+def nature_invest_figure(achat_nature_all_years, selection=None):
+    return yearly_bar_figure(achat_nature_all_years, 'Nature', ACHAT_NATURE_COLUMNS,
+                             title="Achat Marché investi Nature by Year",
+                             menu_title="Achat Marché Nature investissemnt",
+                             selection=selection, yaxis_title="Value", barmode='stack')
+
+
+def achat_cdc_figure(achat_cdc_all_years):
+    return yearly_bar_figure(achat_cdc_all_years, 'Budget', ACHAT_CDC_COLUMNS,
+                             title="Achat CDC par Budget par Année", visible=True,
+                             colors={'Nombre de CDC': 'rgba(55, 83, 109, 0.7)',
+                                     'Montant en Dhs': 'rgba(255, 144, 14, 0.7)'},
+                             yaxis_title="Valeurs (Nombre de CDC / Montant en Dhs)",
+                             legend_title="Année", barmode='stack')
+
+
+def synthese_figure(synthese_all_years):
+    # Un anneau par année, côte à côte
+    fig = go.Figure()
+    groups = list(synthese_all_years.groupby('Year', sort=True))
+    for i, (year, df_year) in enumerate(groups):
+        fig.add_trace(go.Pie(
+            labels=df_year['Type'],
+            values=df_year['Marché'],
+            name=f'{year}',
+            hole=0.4,  # Creates the donut shape
+            hoverinfo='label+percent+name',  # Shows the label, percentage, and year on hover
+            title=f"Année {year}",
+            domain=dict(x=[i / len(groups), (i + 1) / len(groups)]),
+        ))
+    fig.update_layout(
+        title_text="Synthese par Type Data -  by Year",
+        annotations=[
+            dict(text='', x=0.83, y=0.5, font_size=12, showarrow=False)
+        ],
+        showlegend=True
+    )
+    return fig
+
+
+def recettes_frame(data):
+    """Recettes de la dernière année disponible de chaque famille, avec une colonne 'Category'."""
+    frames = []
+    for family, category in [('recettes_fonctionnement', 'Fonctionnement'),
+                             ('recettes_investissement', 'Investissement'),
+                             ('recettes_propres', 'Propres')]:
+        df = data[family]
+        frames.append(df[df['Year'] == df['Year'].max()].assign(Category=category))
+    return pd.concat(frames)
+
+
+def recettes_figure(recettes, year):
+    # Une trace par catégorie de recettes présente dans ``recettes``
+    fig = go.Figure()
+    for category, df_category in recettes.groupby('Category', sort=False):
+        if category == 'Propres':
+            fig.add_trace(go.Bar(
+                x=df_category['Désignation'] if 'Désignation' in df_category.columns else df_category['Subvention'],
+                y=df_category['Montant en Dhs'],
+                name=f'{category} - Montant en Dhs'
+            ))
+        else:
+            fig.add_trace(go.Bar(
+                x=df_category['Subvention'],
+                y=df_category['Montant en dhs'],
+                name=f'{category} - Montant en dhs'
+            ))
+    fig.update_layout(
+        title=f'Revenues by Category for {year}',
+        xaxis_title='Category',
+        yaxis_title='Montant en Dhs',
+        barmode='stack'  # Use 'group' if you prefer separate bars for each category
+    )
+    return fig
+
+
+def grade_figure(repart_grade):
+    import plotly.express as px
+    return px.bar(
+        repart_grade,
+        x='Catégorie',
+        y='Nombre',
+        color='Pourcentage %',
+        title="Répartition par Grade"
+    )
+
+
+def genre_figure(repart_genre):
+    import plotly.express as px
+    return px.pie(
+        repart_genre,
+        names='Genre',
+        values='Nombre',
+        title="Répartition par Genre",
+        hover_data=['Pourcentage %'],
+        labels={'Pourcentage %': '% de Genre'}
+    )
+
+
+def age_figure(repart_age):
+    import plotly.express as px
+    return px.bar(
+        repart_age,
+        x="tranche d'âge",
+        y='Effectif',
+        color='%',
+        title="Répartition par Tranche d'Âge"
+    )
+
+
+def departement_figure(repart_departement):
+    import plotly.express as px
+    return px.pie(
+        limit_categories(repart_departement, 'Entité', ['nombre du personnel']),
+        names='Entité',
+        values='nombre du personnel',
+        title="Répartition par Département",
+        labels={'nombre du personnel': 'Nombre du Personnel'}
+    )
+
+
+def division_figure(repart_division):
+    import plotly.express as px
+    return px.bar(
+        repart_division,
+        x='Divisions',
+        y='Effectifs',
+        color='%',
+        title="Répartition par Division",
+        labels={'Effectifs': 'Effectifs', 'Divisions': 'Division'}
+    )
+
+
+def disponibilite_figure(df_disponibilite):
+    return category_scatter_figure(
+        df_disponibilite,
+        x='Grade',
+        y='Unité',
+        color='Motif',
+        title="Mise en Disponibilité",
+        labels={'Grade': 'Grade', 'Unité': 'Unité'}
+    )
+
+
+def mise_disposition_figure(df_mise_disposition):
+    return category_scatter_figure(
+        df_mise_disposition,
+        x='Grade',
+        y='Unité',
+        color="Administration d'accueil",
+        title="Mise à la Disposition",
+        labels={'Grade': 'Grade', 'Unité': 'Unité'}
+    )
+
+
+def detachements_figure(df_detachements):
+    return category_scatter_figure(
+        df_detachements,
+        x='Grade',
+        y='Unité',
+        color="Administration d'accueil",
+        title="Détachements",
+        labels={'Grade': 'Grade', 'Unité': 'Unité'}
+    )
+
+
+def promotions_figure(df_promotions):
+    import plotly.express as px
+
+    df_promotions_long = df_promotions.melt(
+        id_vars=['Cadre'],
+        value_vars=['Promotion de grade', 'Avancement d’échelon', 'Notation', 'Titularisation'],
+        var_name='Type de Promotion',
+        value_name='Nombre'
+    )
+    return px.bar(
+        df_promotions_long,
+        x='Cadre',
+        y='Nombre',
+        color='Type de Promotion',
+        title="Distribution des Promotions par Cadre"
+    )
+
+
+def stages_figure(df_stages):
+    import plotly.express as px
+
+    df_stages_long = df_stages.melt(var_name='Stage', value_name='Nombre')
+    df_stages_long = df_stages_long[df_stages_long['Stage'].str.contains('Unnamed') == False]
+    return px.bar(df_stages_long, x='Stage', y='Nombre',
+                  title="Répartition des Stages",
+                  labels={'Stage': 'Stage', 'Nombre': 'Nombre'})
+
+
+def mutation_figure(df_mutation):
+    import plotly.express as px
+    return px.bar(df_mutation, x='Grade', title="Mutations par Grade",
+                  labels={'Grade': 'Grade', 'Unnamed: 0': 'Nombre'})
+
+
+def retraite_figure(df_retraite_grade):
+    import plotly.express as px
+    return px.bar(df_retraite_grade, x='Catégorie', y='Départs à la retraite',
+                  title="Départs à la Retraite par Catégorie",
+                  labels={'Catégorie': 'Catégorie', 'Départs à la retraite': 'Départs à la Retraite'})
+
+
+def recrutement_figure(df_recrutment):
+    import plotly.express as px
+    return px.line(df_recrutment, x='ANNEE', y='NOMBRE', color='CADRE',
+                   title="Recrutement par Année",
+                   labels={'ANNEE': 'Année', 'NOMBRE': 'Nombre de Recrutements', 'CADRE': 'Cadre'})
+
+
+def diplome_figure(df_diplome):
+    import plotly.express as px
+
+    df_diplome_long = df_diplome.melt(var_name='Diplôme', value_name='Nombre')
+    df_diplome_long = df_diplome_long.dropna()
+    return px.pie(df_diplome_long, names='Diplôme', values='Nombre',
+                  title="Répartition des Diplômes",
+                  labels={'Nombre': 'Nombre', 'Diplôme': 'Diplôme'})
+
+
+def execution_totals(data, family):
+    """Totaux annuels d'exécution (crédits, engagements, paiements, taux) d'une famille de ``data``."""
+    series = timeseries.execution_series(data[family], timeseries.EXECUTION_COLUMNS[family])
+    return timeseries.execution_totals(series)
+
+
+# Graphique produit sans interaction (mode batch) : nom, feuilles lues,
+# familles annuelles et constructeur recevant les données de la section
+FigureSpec = namedtuple('FigureSpec', ['name', 'sheet_names', 'families', 'build'])
+
+FINANCE_FIGURES = [
+    FigureSpec('budget_sources', (), ['budget_source'],
+               lambda d: budget_sources_figure(timeseries.budget_series(d['budget_source']))),
+    FigureSpec('exploitation', (), ['exploitation'], lambda d: exploitation_figure(d['exploitation'])),
+    FigureSpec('exploitation_taux', (), ['exploitation'],
+               lambda d: execution_rates_figure(execution_totals(d, 'exploitation'), "Taux d'exécution - Exploitation")),
+    FigureSpec('investissement', (), ['investissement'], lambda d: investment_figure(d['investissement'])),
+    FigureSpec('investissement_taux', (), ['investissement'],
+               lambda d: execution_rates_figure(execution_totals(d, 'investissement'),
+                                                "Taux d'exécution - Investissement")),
+    FigureSpec('marches', (), ['marches'], lambda d: marches_figure(d['marches'])),
+    FigureSpec('achat_nature_exploit', (), ['achat_nature_exploit'],
+               lambda d: nature_exploit_figure(d['achat_nature_exploit'])),
+    FigureSpec('achat_nature_invest', (), ['achat_nature_invest'],
+               lambda d: nature_invest_figure(d['achat_nature_invest'])),
+    FigureSpec('achat_cdc', (), ['achat_cdc'], lambda d: achat_cdc_figure(d['achat_cdc'])),
+    FigureSpec('synthese', (), ['synthese'], lambda d: synthese_figure(d['synthese'])),
+    FigureSpec('recettes', (), ['recettes_fonctionnement', 'recettes_investissement', 'recettes_propres'],
+               lambda d: recettes_figure(recettes_frame(d), d['recettes_propres']['Year'].max())),
+]
+
+RH_FIGURES = [
+    FigureSpec('repartition_grade', ['Répartition par Grade'], (), lambda d: grade_figure(d['Répartition par Grade'])),
+    FigureSpec('repartition_genre', ['Répartition par genre'], (), lambda d: genre_figure(d['Répartition par genre'])),
+    FigureSpec('repartition_age', ['Répartition par Age'], (), lambda d: age_figure(d['Répartition par Age'])),
+    FigureSpec('repartition_departement', ['Répartition par Département'], (),
+               lambda d: departement_figure(d['Répartition par Département'])),
+    FigureSpec('repartition_division', ['Repartition par Division'], (),
+               lambda d: division_figure(d['Repartition par Division'])),
+    FigureSpec('mise_en_disponibilite', ['Mise en disponibilité'], (),
+               lambda d: disponibilite_figure(d['Mise en disponibilité'])),
+    FigureSpec('mise_a_disposition', ['Mise à la disposistion'], (),
+               lambda d: mise_disposition_figure(d['Mise à la disposistion'])),
+    FigureSpec('detachements', ['Détéchements'], (), lambda d: detachements_figure(d['Détéchements'])),
+    FigureSpec('promotions', ['Promotions'], (), lambda d: promotions_figure(d['Promotions'])),
+    FigureSpec('stages', ['Stages'], (), lambda d: stages_figure(d['Stages'])),
+    FigureSpec('mutations', ['Mutation permutation'], (), lambda d: mutation_figure(d['Mutation permutation'])),
+    FigureSpec('retraite', ['Retraite par grade'], (), lambda d: retraite_figure(d['Retraite par grade'])),
+    FigureSpec('recrutement', ['Recrutment depuis 2015'], (), lambda d: recrutement_figure(d['Recrutment depuis 2015'])),
+    FigureSpec('diplomes', ['Repartition par diplome'], (), lambda d: diplome_figure(d['Repartition par diplome'])),
+]
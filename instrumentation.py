@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+# Mesure d'une étape : type ('lecture', 'transformation', 'figure', 'rendu'),
+# nom (feuille, section ou graphique), durée (s), lignes, octets et pic
+# mémoire Python pendant l'étape (octets, 0 si non suivi)
+Step = namedtuple('Step', ['kind', 'name', 'seconds', 'rows', 'nbytes', 'peak_bytes'])
+
+PROMETHEUS_METRICS = [
+    ('seconds', 'dashboard_step_seconds', "Durée de la dernière exécution de l'étape (s)"),
+    ('rows', 'dashboard_step_rows', "Lignes (ou points tracés) traitées par l'étape"),
+    ('nbytes', 'dashboard_step_bytes', "Taille des données produites par l'étape (octets)"),
+    ('peak_bytes', 'dashboard_step_peak_bytes', "Pic de mémoire Python pendant l'étape (octets)"),
+]
+
+
+def figure_size(fig):
+    """Nombre de points tracés et taille JSON envoyée au navigateur d'une figure Plotly."""
+    points = 0
+    for trace in fig.data:
+        values = getattr(trace, 'x', None)
+        if values is None:
+            values = getattr(trace, 'values', None)
+        points += len(values) if values is not None else 0
+    return points, len(fig.to_json())
+
+
+# Sessions qui ont activé les mesures : tracemalloc suit tout le processus,
+# il n'est démarré qu'à la première et arrêté qu'après la dernière
+_tracing_sessions = 0
+_tracing_lock = threading.Lock()
+
+
+def _acquire_tracing():
+    global _tracing_sessions
+    with _tracing_lock:
+        _tracing_sessions += 1
+        if _tracing_sessions == 1 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+def _release_tracing():
+    global _tracing_sessions
+    with _tracing_lock:
+        _tracing_sessions -= 1
+        if _tracing_sessions == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Recorder:
+    """Mesures des dernières étapes exécutées, désactivées par défaut.
+
+    Quand ``enabled`` est vrai, ``measure`` chronomètre un bloc et le pic
+    mémoire est suivi avec tracemalloc (ce qui ralentit l'application :
+    à réserver au diagnostic). Le suivi est commun au processus : il reste
+    actif tant qu'une session au moins a activé les mesures, et le pic
+    d'une étape peut inclure des allocations faites au même moment par
+    d'autres sessions.
+    """
+
+    def __init__(self, max_steps=1000):
+        self.enabled = False
+        self.steps = deque(maxlen=max_steps)
+        self._tracing = None
+
+    def enable(self, enabled):
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        if enabled:
+            _acquire_tracing()
+            # Libéré aussi si la session se termine sans désactiver les mesures
+            self._tracing = weakref.finalize(self, _release_tracing)
+        else:
+            self._tracing()
+
+    @contextmanager
+    def measure(self, kind, name):
+        """Mesure le bloc ; le dictionnaire produit reçoit ses 'rows' et 'nbytes'."""
+        sizes = {'rows': 0, 'nbytes': 0}
+        if not self.enabled:
+            yield sizes
+            return
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield sizes
+        finally:
+            seconds = time.perf_counter() - start
+            # Suivi arrêté ou remis à zéro pendant l'étape : pas de pic négatif
+            peak = max(0, tracemalloc.get_traced_memory()[1] - base) if tracing else 0
+            self.steps.append(Step(kind, name, seconds, sizes['rows'], sizes['nbytes'], peak))
+
+    def record(self, kind, stats):
+        """Ajoute des mesures de lecture déjà prises (``loader.SheetStats``)."""
+        if self.enabled:
+            self.steps.extend(Step(kind, s.sheet, s.seconds, s.rows, s.nbytes, s.peak_bytes) for s in stats)
+
+    def latest(self):
+        """Dernière mesure de chaque étape (type, nom)."""
+        return list({(step.kind, step.name): step for step in self.steps}.values())
+
+    def to_json(self):
+        return json.dumps([step._asdict() for step in self.latest()], ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Dernières mesures au format texte d'exposition Prometheus."""
+        lines = []
+        steps = self.latest()
+        for field, metric, description in PROMETHEUS_METRICS:
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} gauge')
+            for step in steps:
+                labels = f'kind="{_escape(step.kind)}",name="{_escape(step.name)}"'
+                lines.append(f'{metric}{{{labels}}} {getattr(step, field)}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        self.steps.clear()
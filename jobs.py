@@ -0,0 +1,147 @@
+"""Lectures de feuilles en arrière-plan, communes à toutes les sessions.
+
+Les lectures sont confiées à un pool de fils d'exécution. Chaque feuille,
+identifiée par son empreinte (voir ``catalog.sheet_fingerprints``), n'est
+lue que par une seule tâche à la fois : une session qui demande une
+feuille déjà en cours de lecture suit la tâche existante au lieu d'en
+lancer une autre. Les feuilles lues sont placées dans le magasin partagé
+(``cache.shared_store``) au fur et à mesure, si bien qu'une section peut
+s'afficher avant la fin de la tâche.
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from loader import read_sheets
+from snapshot import read_with_snapshots
+
+# Lectures menées en parallèle par le processus serveur
+JOB_WORKERS = int(os.environ.get('DASHBOARD_JOB_WORKERS', '2'))
+
+# Lectures lancées au plus pour une même feuille : au-delà (feuille évincée
+# ou refusée par le magasin), l'application la relit elle-même
+MAX_ATTEMPTS = 2
+
+# Issues de tâches terminées conservées (une par empreinte)
+FINISHED_KEEP = 10000
+
+# État d'une feuille dans sa tâche
+PENDING = 'en attente'
+READY = 'prête'
+FAILED = 'erreur'
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def job_id(sheet_keys):
+    """Identifiant d'une tâche, tiré des empreintes de ses feuilles : la même demande donne le même identifiant."""
+    return hashlib.sha256('\n'.join(sorted(sheet_keys)).encode()).hexdigest()[:12]
+
+
+class Job:
+    """Lecture d'un groupe de feuilles d'un même fichier.
+
+    ``sheet_keys`` associe chaque feuille à son empreinte ; ``status`` donne
+    l'état de chaque empreinte (``PENDING``, ``READY`` ou ``FAILED``).
+    """
+
+    def __init__(self, sheet_keys):
+        self.sheet_keys = dict(sheet_keys)
+        self.id = job_id(self.sheet_keys.values())
+        self.status = dict.fromkeys(self.sheet_keys.values(), PENDING)
+        self.stats = []
+        self.error = None
+        self.future = None
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+
+class JobQueue:
+    """File des lectures en arrière-plan, alimentant le magasin ``store``."""
+
+    def __init__(self, store, workers=JOB_WORKERS):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='lecture')
+        self._lock = threading.Lock()
+        self._running = {}
+        # Dernière tâche terminée et nombre de lectures lancées, par empreinte
+        self._finished = OrderedDict()
+
+    def submit(self, data, sheet_keys, reader=read_sheets):
+        """Lance la lecture des feuilles absentes du magasin et retourne {empreinte: Job}.
+
+        ``data`` est le contenu du fichier (octets), ``sheet_keys`` associe
+        chaque feuille demandée à son empreinte. Les feuilles déjà en cours
+        de lecture sont rattachées à leur tâche ; les autres forment une
+        nouvelle tâche. Une feuille dont la lecture a échoué, ou déjà lue
+        ``MAX_ATTEMPTS`` fois sans rester dans le magasin, n'est pas relancée :
+        sa dernière tâche, terminée, est retournée. Le résultat est vide si
+        tout est déjà dans le magasin.
+        """
+        jobs = {}
+        to_read = {}
+        with self._lock:
+            for name, key in sheet_keys.items():
+                if key in self.store:
+                    continue
+                if key in self._running:
+                    jobs[key] = self._running[key]
+                    continue
+                finished, attempts = self._finished.get(key, (None, 0))
+                if finished is not None and (finished.status[key] == FAILED or attempts >= MAX_ATTEMPTS):
+                    jobs[key] = finished
+                else:
+                    to_read[name] = key
+            if to_read:
+                job = Job(to_read)
+                for key in to_read.values():
+                    self._running[key] = job
+                    jobs[key] = job
+                job.future = self._executor.submit(self._run, job, data, reader)
+        return jobs
+
+    def _run(self, job, data, reader):
+        def on_sheet(name, df):
+            key = job.sheet_keys[name]
+            self.store.put(key, df)
+            job.status[key] = READY
+
+        try:
+            _, job.stats = read_with_snapshots(io.BytesIO(data), job.sheet_keys, reader=reader, on_sheet=on_sheet)
+        except Exception as e:
+            job.error = e
+            for key, state in job.status.items():
+                if state != READY:
+                    job.status[key] = FAILED
+        finally:
+            with self._lock:
+                for key in job.sheet_keys.values():
+                    if self._running.get(key) is job:
+                        del self._running[key]
+                    attempts = self._finished.pop(key, (None, 0))[1]
+                    self._finished[key] = (job, attempts + 1)
+                while len(self._finished) > FINISHED_KEEP:
+                    self._finished.popitem(last=False)
+
+
+def wait_jobs(jobs, timeout=None):
+    """Attend la fin de la première des tâches ``jobs`` (ou de toutes si ``timeout`` est None)."""
+    futures = [job.future for job in jobs]
+    if timeout is None:
+        wait(futures)
+    else:
+        wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+
+
+def job_queue(store):
+    """File du processus, créée au premier appel."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(store)
+        return _queue
@@ -0,0 +1,106 @@
+import pandas as pd
+
+import timeseries
+
+# Format long de la table des indicateurs ; 'Year' est vide pour les
+# indicateurs RH, 'Dimension' est vide pour les totaux
+KPI_COLUMNS = ['Domaine', 'Indicateur', 'Year', 'Dimension', 'Valeur']
+
+# Familles annuelles (voir catalog.py) et feuilles RH utilisées par les indicateurs
+FINANCE_FAMILIES = ['budget_source', 'exploitation', 'investissement']
+RH_SHEETS = ['Répartition par Grade', 'Répartition par genre', 'Répartition par Age']
+
+# Domaine et colonnes (crédits, engagements, paiements) des feuilles d'exécution budgétaire
+EXECUTION_COLUMNS = {
+    'exploitation': ('Exploitation', timeseries.EXECUTION_COLUMNS['exploitation']),
+    'investissement': ('Investissement', timeseries.EXECUTION_COLUMNS['investissement']),
+}
+
+
+def _melt_by_year(frame, domaine):
+    # frame : une ligne par année, une colonne par indicateur
+    long = frame.rename_axis('Year').reset_index().melt(id_vars='Year', var_name='Indicateur', value_name='Valeur')
+    return long.assign(Domaine=domaine, Dimension='')
+
+
+def _by_dimension(values, domaine, indicateur):
+    # values : Series indexée par la dimension (genre, grade, tranche d'âge...)
+    return pd.DataFrame({
+        'Domaine': domaine,
+        'Indicateur': indicateur,
+        'Year': pd.NA,
+        'Dimension': values.index.astype(str),
+        'Valeur': values.to_numpy(dtype=float),
+    })
+
+
+def execution_kpis(df, columns):
+    """Crédits, engagements, paiements, disponible et taux d'exécution, pour toutes les années à la fois.
+
+    Lus dans les totaux annuels de ``timeseries.execution_series`` ; taux
+    d'engagement = engagements / crédits ouverts, taux de paiement =
+    paiements / engagements (en %).
+    """
+    totals = timeseries.execution_totals(timeseries.execution_series(df, columns))
+    sums = totals[timeseries.EXECUTION_MEASURES].copy()
+    sums['Disponible'] = sums['Crédits ouverts'] - sums['Engagements']
+    sums[timeseries.RATE_COLUMNS] = totals[timeseries.RATE_COLUMNS]
+    sums['Engagements - évolution (%)'] = totals['Engagements - évolution (%)']
+    return sums
+
+
+def finance_kpis(data):
+    """Table des indicateurs financiers à partir des familles annuelles disponibles dans ``data``."""
+    parts = []
+    if 'budget_source' in data:
+        totals = timeseries.add_trends(
+            timeseries.year_totals(timeseries.budget_series(data['budget_source']), ['Dotation reçue']),
+            ['Dotation reçue'])
+        parts.append(_melt_by_year(totals[['Dotation reçue', 'Dotation reçue - évolution (%)']], 'Budget'))
+    for family, (domaine, columns) in EXECUTION_COLUMNS.items():
+        if family in data:
+            parts.append(_melt_by_year(execution_kpis(data[family], columns), domaine))
+    return _finish(parts)
+
+
+def rh_kpis(sheets):
+    """Table des effectifs (total, par genre, grade et tranche d'âge) à partir des feuilles RH disponibles."""
+    parts = []
+    total = None
+    if 'Répartition par Grade' in sheets:
+        grade = sheets['Répartition par Grade']
+        nombre = pd.to_numeric(grade['Nombre'], errors='coerce').astype('float64')
+        total = nombre.sum()
+        parts.append(_by_dimension(pd.Series([total], index=['']), 'RH', 'Effectif total'))
+        parts.append(_by_dimension(nombre.groupby(grade['Catégorie'], observed=True).sum(), 'RH', 'Effectif par grade'))
+    if 'Répartition par genre' in sheets:
+        genre = sheets['Répartition par genre']
+        par_genre = pd.to_numeric(genre['Nombre'], errors='coerce').groupby(genre['Genre'], observed=True).sum()
+        parts.append(_by_dimension(par_genre, 'RH', 'Effectif par genre'))
+        if total:
+            parts.append(_by_dimension(par_genre / total * 100, 'RH', 'Part par genre (%)'))
+    if 'Répartition par Age' in sheets:
+        age = sheets['Répartition par Age']
+        par_age = pd.to_numeric(age['Effectif'], errors='coerce').groupby(age["tranche d'âge"], observed=True).sum()
+        parts.append(_by_dimension(par_age, 'RH', "Effectif par tranche d'âge"))
+    return _finish(parts)
+
+
+def combine_kpis(tables):
+    """Une seule table à partir de tables d'indicateurs calculées séparément (ex. une par famille)."""
+    return _finish([table for table in tables if len(table)])
+
+
+def _finish(parts):
+    if not parts:
+        return pd.DataFrame(columns=KPI_COLUMNS)
+    table = pd.concat(parts, ignore_index=True)[KPI_COLUMNS]
+    table['Year'] = table['Year'].astype('Int64')
+    return table
+
+
+def kpi_series(table, domaine, indicateur):
+    """Valeurs d'un indicateur, indexées par année (ou par dimension pour les indicateurs RH)."""
+    rows = table[(table['Domaine'] == domaine) & (table['Indicateur'] == indicateur)]
+    index = 'Dimension' if rows['Year'].isna().all() else 'Year'
+    return rows.set_index(index)['Valeur']
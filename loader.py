@@ -0,0 +1,119 @@
+import io
+import multiprocessing
+import os
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from cache import frame_nbytes
+from schema import normalize_frame
+
+# Mesures d'une lecture : durée (s), nombre de lignes, mémoire occupée et pic
+# mémoire Python pendant la lecture (octets ; 0 si tracemalloc n'est pas actif)
+SheetStats = namedtuple('SheetStats', ['sheet', 'seconds', 'rows', 'nbytes', 'peak_bytes'], defaults=[0])
+
+# Nom réservé pour mesurer l'ouverture du classeur lui-même
+OPEN_STEP = '(ouverture du classeur)'
+
+# Nombre de processus pour la lecture parallèle (1 = lecture en série)
+PARSE_WORKERS = int(os.environ.get('DASHBOARD_PARSE_WORKERS', '1'))
+
+# En dessous de cette taille, lancer des processus coûte plus cher que la lecture
+PARALLEL_MIN_BYTES = int(os.environ.get('DASHBOARD_PARALLEL_MIN_BYTES', 5 * 1024 * 1024))
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _read_serial(source, sheet_names, on_sheet=None):
+    stats = []
+    frames = {}
+    start = time.perf_counter()
+    with pd.ExcelFile(source) as excel:
+        stats.append(SheetStats(OPEN_STEP, time.perf_counter() - start, 0, 0))
+        for name in sheet_names:
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            df = normalize_frame(excel.parse(name))
+            seconds = time.perf_counter() - start
+            peak = max(0, tracemalloc.get_traced_memory()[1] - base) if tracing else 0
+            frames[name] = df
+            stats.append(SheetStats(name, seconds, len(df), frame_nbytes(df), peak))
+            if on_sheet is not None:
+                on_sheet(name, df)
+    return frames, stats
+
+
+def read_headers(source, sheet_names):
+    """En-têtes normalisés de chaque feuille, sans lire les lignes de données."""
+    with pd.ExcelFile(source) as excel:
+        return {name: list(normalize_frame(excel.parse(name, nrows=0)).columns) for name in sheet_names}
+
+
+def _parse_group(data, sheet_names):
+    # Exécuté dans un processus fils : chaque groupe ouvre le classeur une fois
+    return _read_serial(io.BytesIO(data), sheet_names)
+
+
+def _get_pool(workers):
+    # Le pool est conservé entre les réexécutions pour ne pas relancer les
+    # processus ; il n'est recréé que si le nombre de processus configuré change
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # 'spawn' : on ne duplique pas les threads du serveur Streamlit
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def _as_bytes(source):
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def read_sheets(source, sheet_names, workers=None, on_sheet=None):
+    """Lit toutes les feuilles demandées en ouvrant le classeur une seule fois.
+
+    Avec ``workers`` > 1 et un fichier assez volumineux, les feuilles sont
+    réparties entre plusieurs processus ; sinon la lecture se fait en série.
+    Retourne un dictionnaire {nom de feuille: DataFrame} et la liste des
+    ``SheetStats`` mesurés pour chaque feuille. ``on_sheet(nom, df)`` est
+    appelé dès qu'une feuille est lue (par groupe en lecture parallèle).
+    """
+    if workers is None:
+        workers = PARSE_WORKERS
+    # Le pool garde sa taille ; seul le nombre de groupes suit le nombre de feuilles
+    groups_count = min(workers, len(sheet_names))
+    if groups_count <= 1:
+        return _read_serial(source, sheet_names, on_sheet)
+    data = _as_bytes(source)
+    if len(data) < PARALLEL_MIN_BYTES:
+        return _read_serial(io.BytesIO(data), sheet_names, on_sheet)
+
+    # Répartition circulaire des feuilles entre les processus
+    groups = [sheet_names[i::groups_count] for i in range(groups_count)]
+    pool = _get_pool(workers)
+    frames = {}
+    stats = []
+    for group_frames, group_stats in pool.map(_parse_group, [data] * groups_count, groups):
+        frames.update(group_frames)
+        stats.extend(group_stats)
+        if on_sheet is not None:
+            for name, df in group_frames.items():
+                on_sheet(name, df)
+    # Même ordre que la lecture en série
+    frames = {name: frames[name] for name in sheet_names}
+    return frames, stats
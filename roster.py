@@ -0,0 +1,236 @@
+"""Liste du personnel (une ligne par agent) : effectifs par grade, genre, âge...
+
+Les effectifs sont comptés en un seul regroupement sur toutes les
+dimensions à la fois (grade x genre x âge x ...) ; chaque feuille
+« Répartition par ... » lue par la vue RH en est une marge, si bien que
+toutes les feuilles portent sur les mêmes agents.
+
+Un export CSV peut compter plusieurs millions de lignes. Il est lu par
+blocs de ``CSV_CHUNK_ROWS`` lignes, en ne gardant que les colonnes
+utiles ; seuls les effectifs par combinaison de valeurs sont conservés
+d'un bloc à l'autre, si bien que la mémoire utilisée ne dépend pas de la
+taille du fichier.
+"""
+import codecs
+import os
+import time
+
+import pandas as pd
+
+from cache import frame_nbytes
+from loader import SheetStats
+from schema import header_key, normalize_frame
+
+# Lignes lues par bloc
+CSV_CHUNK_ROWS = int(os.environ.get('DASHBOARD_CSV_CHUNK_ROWS', '200000'))
+
+# Dimensions reconnues dans l'export, avec les en-têtes acceptés
+ROSTER_COLUMNS = {
+    'Catégorie': ['Catégorie', 'Categorie'],
+    'Genre': ['Genre', 'Sexe'],
+    "tranche d'âge": ["tranche d'âge", 'tranche d’âge', "tranche d'age"],
+    'Entité': ['Entité', 'Entite', 'Département', 'Departement'],
+    'Divisions': ['Divisions', 'Division'],
+    'Diplôme': ['Diplôme', 'Diplome'],
+}
+
+# Âge en années, découpé en tranches quand l'export n'a pas de tranche d'âge
+AGE_COLUMNS = ['Âge', 'Age']
+AGE_BINS = [0, 30, 40, 50, 60, 200]
+AGE_LABELS = ['Moins de 30 ans', '30-39 ans', '40-49 ans', '50-59 ans', '60 ans et plus']
+
+# Feuille produite pour chaque dimension : (nom, colonne de l'effectif, colonne du pourcentage) ;
+# sans colonne d'effectif, la feuille a une seule ligne et une colonne par valeur
+REPARTITION_SHEETS = {
+    'Catégorie': ('Répartition par Grade', 'Nombre', 'Pourcentage %'),
+    'Genre': ('Répartition par genre', 'Nombre', 'Pourcentage %'),
+    "tranche d'âge": ('Répartition par Age', 'Effectif', '%'),
+    'Entité': ('Répartition par Département', 'nombre du personnel', None),
+    'Divisions': ('Repartition par Division', 'Effectifs', '%'),
+    'Diplôme': ('Repartition par diplome', None, None),
+}
+
+# Ligne des agents sans valeur pour la dimension d'une feuille
+BLANK_LABEL = 'Non renseigné'
+
+# Nom réservé pour les mesures de lecture de l'export
+READ_STEP = '(export CSV)'
+
+_HEADER_DIMENSIONS = {header_key(alias).lower(): dimension
+                      for dimension, aliases in ROSTER_COLUMNS.items() for alias in aliases}
+_HEADER_DIMENSIONS.update((header_key(alias).lower(), 'Âge') for alias in AGE_COLUMNS)
+
+
+def _dimension(column):
+    return _HEADER_DIMENSIONS.get(header_key(str(column)).lower())
+
+
+def _match_columns(header):
+    columns = {}
+    for column in header:
+        # Première colonne reconnue pour chaque dimension
+        if _dimension(column) and _dimension(column) not in columns.values():
+            columns[column] = _dimension(column)
+    # Une tranche d'âge fournie par la liste l'emporte sur l'âge
+    if "tranche d'âge" in columns.values():
+        columns = {column: dimension for column, dimension in columns.items() if dimension != 'Âge'}
+    return columns
+
+
+def _open(source):
+    # Le fichier est relu depuis le début ; un chemin est ouvert en binaire
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    source.seek(0)
+    return source
+
+
+def _sniff(source):
+    """Séparateur (';' ou ',') et encodage de l'export, d'après son début."""
+    stream = _open(source)
+    try:
+        head = stream.read(64 * 1024)
+    finally:
+        if stream is not source:
+            stream.close()
+    try:
+        # Décodage incrémental : un caractère coupé en fin de bloc n'est pas une erreur
+        text = codecs.getincrementaldecoder('utf-8-sig')().decode(head, final=False)
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        text = head.decode('latin-1')
+        encoding = 'latin-1'
+    first_line = text.split('\n', 1)[0]
+    return (';' if first_line.count(';') > first_line.count(',') else ','), encoding
+
+
+def roster_columns(source):
+    """Dimensions présentes dans l'export : {en-tête du fichier: dimension}, d'après la seule ligne d'en-tête."""
+    sep, encoding = _sniff(source)
+    stream = _open(source)
+    try:
+        header = pd.read_csv(stream, sep=sep, encoding=encoding, nrows=0).columns
+    finally:
+        if stream is not source:
+            stream.close()
+    return _match_columns(header)
+
+
+def roster_sheet_names(source):
+    """Feuilles « Répartition par ... » que l'export permet de produire."""
+    dimensions = set(roster_columns(source).values())
+    if 'Âge' in dimensions:
+        dimensions.add("tranche d'âge")
+    return [sheet for dimension, (sheet, _, _) in REPARTITION_SHEETS.items() if dimension in dimensions]
+
+
+def _age_tranches(ages):
+    # Découpage calculé sur les valeurs distinctes de l'âge puis reporté sur les lignes
+    ages = ages.astype('category')
+    years = pd.to_numeric(ages.cat.categories.astype(str).str.replace(',', '.', regex=False), errors='coerce')
+    tranches = pd.Series(pd.cut(years, AGE_BINS, right=False, labels=AGE_LABELS)).cat.add_categories('')
+    return ages.map(dict(zip(ages.cat.categories, tranches.fillna(''))))
+
+
+def roster_counts(df):
+    """Effectifs par combinaison de valeurs des dimensions, en un seul regroupement.
+
+    ``df`` a une colonne par dimension (noms de ``ROSTER_COLUMNS`` ou 'Âge',
+    découpé en tranches d'âge). Retourne une Series indexée par ces
+    dimensions ; les valeurs manquantes sont comptées sous la valeur vide.
+    """
+    if 'Âge' in df.columns:
+        df = df.assign(**{"tranche d'âge": _age_tranches(df['Âge'])}).drop(columns='Âge')
+    df = df.astype('category')
+    df = df.apply(lambda values: values.cat.add_categories('') if '' not in values.cat.categories else values)
+    return df.fillna('').groupby(list(df.columns), observed=True, sort=False).size()
+
+
+def _add_counts(total, counts):
+    if total is None:
+        return counts
+    return pd.concat([total, counts]).groupby(level=list(range(counts.index.nlevels)), sort=False).sum()
+
+
+def _finish_counts(counts):
+    # Valeurs nettoyées sur la table des combinaisons, pas ligne par ligne
+    keys = counts.index.to_frame(index=False).astype(str).apply(lambda values: values.str.strip())
+    return pd.Series(counts.to_numpy(), index=pd.MultiIndex.from_frame(keys)).groupby(
+        level=list(keys.columns), sort=False).sum()
+
+
+def stream_counts(source, chunksize=None):
+    """Effectifs par combinaison de valeurs des dimensions, cumulés bloc par bloc.
+
+    Retourne (Series des effectifs indexée par dimension, nombre de lignes lues).
+    """
+    columns = roster_columns(source)
+    sep, encoding = _sniff(source)
+    counts = None
+    rows = 0
+    stream = _open(source)
+    try:
+        reader = pd.read_csv(stream, sep=sep, encoding=encoding, usecols=list(columns), dtype='category',
+                             na_filter=False, chunksize=chunksize or CSV_CHUNK_ROWS)
+        for chunk in reader:
+            rows += len(chunk)
+            counts = _add_counts(counts, roster_counts(chunk.rename(columns=columns)))
+    finally:
+        if stream is not source:
+            stream.close()
+    if counts is None:
+        return pd.Series(dtype='int64'), rows
+    return _finish_counts(counts), rows
+
+
+def repartition_frames(counts):
+    """Feuilles « Répartition par ... » (mêmes colonnes que dans les classeurs RH) à partir des effectifs.
+
+    Chaque feuille est la somme de ``counts`` sur sa dimension ; les agents
+    sans valeur pour cette dimension y sont comptés sous ``BLANK_LABEL``, en
+    dernière ligne, si bien que toutes les feuilles ont le même total.
+    """
+    frames = {}
+    for dimension, (sheet, count_column, percent_column) in REPARTITION_SHEETS.items():
+        if dimension not in counts.index.names:
+            continue
+        values = counts.groupby(level=dimension, sort=False).sum()
+        values = values[values > 0].rename(index={'': BLANK_LABEL}).groupby(level=0, sort=False).sum()
+        blank = values[values.index == BLANK_LABEL]
+        values = values[values.index != BLANK_LABEL].sort_values(ascending=False)
+        if dimension == "tranche d'âge" and set(values.index) <= set(AGE_LABELS):
+            # Tranches calculées depuis l'âge : dans l'ordre des âges
+            values = values.reindex([label for label in AGE_LABELS if label in values.index])
+        values = pd.concat([values, blank])
+        if count_column is None:
+            df = pd.DataFrame([values.to_numpy()], columns=values.index.astype(str))
+        else:
+            df = pd.DataFrame({dimension: values.index.astype(str), count_column: values.to_numpy()})
+            if percent_column:
+                df[percent_column] = (df[count_column] / df[count_column].sum() * 100).round(2)
+        frames[sheet] = normalize_frame(df)
+    return frames
+
+
+def roster_frames(df):
+    """Feuilles « Répartition par ... » d'une liste du personnel déjà chargée (une ligne par agent)."""
+    columns = _match_columns(df.columns)
+    counts = roster_counts(df[list(columns)].rename(columns=columns))
+    return repartition_frames(_finish_counts(counts))
+
+
+def read_roster_csv(source, sheet_names=None, on_sheet=None):
+    """Lit l'export en un seul passage et retourne les feuilles demandées et les mesures de lecture.
+
+    Même interface que ``loader.read_sheets``, pour ``snapshot.read_with_snapshots``.
+    """
+    start = time.perf_counter()
+    counts, rows = stream_counts(source)
+    frames = repartition_frames(counts)
+    if sheet_names is not None:
+        frames = {name: frames[name] for name in sheet_names}
+    if on_sheet is not None:
+        for name, df in frames.items():
+            on_sheet(name, df)
+    nbytes = sum(frame_nbytes(df) for df in frames.values())
+    return frames, [SheetStats(READ_STEP, time.perf_counter() - start, rows, nbytes)]
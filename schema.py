@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+
+# Types des colonnes connues, par nom d'en-tête sans espaces de début/fin :
+#  - 'montant'     : float64 (les sommes en dirhams gardent leur précision)
+#  - 'nombre'      : int32, ou float32 s'il manque des valeurs
+#  - 'pourcentage' : float32 ('85%' et '85,5' sont acceptés)
+#  - 'libelle'     : catégorie
+COLUMN_TYPES = {
+    # Finance
+    'Dotation reçue': 'montant',
+    'Crédits ouverts  (A)': 'montant',
+    'Engagements \n(B)': 'montant',
+    'Paiements \n(C)': 'montant',
+    'Crédits ouverts Hors reports (A)': 'montant',
+    'Engagements Hors Reports (B)': 'montant',
+    'Paiements Hors Reports (C)': 'montant',
+    'Reports\nD= (B-C)': 'montant',
+    'Disponible (A-B)': 'montant',
+    'Montant en Dhs': 'montant',
+    'Montant en dhs': 'montant',
+    '% Engagement': 'pourcentage',
+    '% Paiement': 'pourcentage',
+    'Nombre de contrats': 'nombre',
+    'Nombre de marché': 'nombre',
+    'Nombre de CDC': 'nombre',
+    'Marché': 'nombre',
+    'Programme': 'libelle',
+    'Source': 'libelle',
+    'Nature': 'libelle',
+    'Objet': 'libelle',
+    'Budget': 'libelle',
+    'Type': 'libelle',
+    'Subvention': 'libelle',
+    'Désignation': 'libelle',
+    # Ressources humaines
+    'Nombre': 'nombre',
+    'Effectif': 'nombre',
+    'Effectifs': 'nombre',
+    'nombre du personnel': 'nombre',
+    'NOMBRE': 'nombre',
+    'ANNEE': 'nombre',
+    'Départs à la retraite': 'nombre',
+    'Promotion de grade': 'nombre',
+    'Avancement d’échelon': 'nombre',
+    'Notation': 'nombre',
+    'Titularisation': 'nombre',
+    'Pourcentage %': 'pourcentage',
+    '%': 'pourcentage',
+    'Grade': 'libelle',
+    'Catégorie': 'libelle',
+    'Genre': 'libelle',
+    "tranche d'âge": 'libelle',
+    'Entité': 'libelle',
+    'Divisions': 'libelle',
+    'Unité': 'libelle',
+    'Motif': 'libelle',
+    "Administration d'accueil": 'libelle',
+    'Cadre': 'libelle',
+    'CADRE': 'libelle',
+}
+
+# Variantes d'en-têtes rencontrées dans les classeurs, renommées vers le nom
+# canonique à la lecture. Les différences d'espaces et de retours à la ligne
+# ('Engagements (B)' pour 'Engagements \n(B)') sont tolérées sans alias.
+COLUMN_ALIASES = {
+    'Dotation reçue': ['Dotation recue', 'Dotation Reçue'],
+    'Nombre de marché': ['Nombre de marchés'],
+    'Départs à la retraite': ['Départ à la retraite'],
+    'Avancement d’échelon': ["Avancement d'échelon"],
+    "tranche d'âge": ["Tranche d'âge", 'tranche d’âge'],
+    "Administration d'accueil": ['Administration d’accueil'],
+}
+
+# Colonnes attendues par famille de feuilles annuelles (voir catalog.py)
+FAMILY_SCHEMAS = {
+    'budget_source': ['Source', 'Dotation reçue'],
+    'exploitation': ['Programme', 'Crédits ouverts  (A)', 'Engagements \n(B)', 'Paiements \n(C)'],
+    'investissement': ['Programme', 'Crédits ouverts Hors reports (A)', 'Engagements Hors Reports (B)',
+                       '% Engagement', 'Paiements Hors Reports (C)', '% Paiement', 'Reports\nD= (B-C)',
+                       'Disponible (A-B)'],
+    'marches': ['Objet', 'Nombre de contrats', 'Montant en Dhs'],
+    'achat_nature_exploit': ['Nature', 'Nombre de marché', 'Montant en Dhs'],
+    'achat_nature_invest': ['Nature', 'Nombre de marché', 'Montant en Dhs'],
+    'achat_cdc': ['Budget', 'Nombre de CDC', 'Montant en Dhs'],
+    'synthese': ['Type', 'Marché'],
+    'recettes_fonctionnement': ['Subvention', 'Montant en dhs'],
+    'recettes_investissement': ['Subvention', 'Montant en dhs'],
+    'recettes_propres': ['Montant en Dhs'],
+}
+
+# Colonnes attendues par feuille RH ('Stages' et 'Repartition par diplome'
+# sont lues colonne par colonne, sans en-tête imposé)
+SHEET_SCHEMAS = {
+    'Répartition par Grade': ['Catégorie', 'Nombre', 'Pourcentage %'],
+    'Répartition par genre': ['Genre', 'Nombre', 'Pourcentage %'],
+    'Répartition par Age': ["tranche d'âge", 'Effectif', '%'],
+    'Répartition par Département': ['Entité', 'nombre du personnel'],
+    'Repartition par Division': ['Divisions', 'Effectifs', '%'],
+    'Mise en disponibilité': ['Grade', 'Unité', 'Motif'],
+    'Mise à la disposistion': ['Grade', 'Unité', "Administration d'accueil"],
+    'Détéchements': ['Grade', 'Unité', "Administration d'accueil"],
+    'Promotions': ['Cadre', 'Promotion de grade', 'Avancement d’échelon', 'Notation', 'Titularisation'],
+    'Mutation permutation': ['Grade'],
+    'Retraite par grade': ['Catégorie', 'Départs à la retraite'],
+    'Recrutment depuis 2015': ['ANNEE', 'NOMBRE', 'CADRE'],
+}
+
+
+def header_key(name):
+    """En-tête sans espaces superflus : clé de comparaison avec le registre."""
+    return ' '.join(name.split())
+
+
+def _canonical_names():
+    names = {}
+    for columns in [COLUMN_TYPES, *FAMILY_SCHEMAS.values(), *SHEET_SCHEMAS.values()]:
+        names.update((header_key(column), column) for column in columns)
+    for column, aliases in COLUMN_ALIASES.items():
+        names.update((header_key(alias), column) for alias in aliases)
+    return names
+
+
+# {clé d'en-tête: nom canonique}, pour les colonnes connues et leurs alias
+CANONICAL_NAMES = _canonical_names()
+
+
+def canonical_name(column):
+    """Nom canonique d'un en-tête connu, sinon l'en-tête sans espaces de début/fin."""
+    if not isinstance(column, str):
+        return column
+    return CANONICAL_NAMES.get(header_key(column), column.strip())
+
+
+def expected_columns(catalog, sheet_names):
+    """Colonnes attendues pour chaque feuille du classeur couverte par le registre."""
+    expected = {}
+    for family, years in catalog.items():
+        if family in FAMILY_SCHEMAS:
+            expected.update((name, FAMILY_SCHEMAS[family]) for name in years.values())
+    expected.update((name, SHEET_SCHEMAS[name]) for name in sheet_names if name in SHEET_SCHEMAS)
+    return expected
+
+
+def check_headers(headers, expected):
+    """Colonnes manquantes par feuille : {feuille: [colonnes]}, vide si tout est conforme.
+
+    ``headers`` contient les en-têtes normalisés de chaque feuille (voir
+    ``loader.read_headers``).
+    """
+    missing = {}
+    for name, columns in expected.items():
+        absent = [column for column in columns if column not in headers.get(name, [])]
+        if absent:
+            missing[name] = absent
+    return missing
+
+
+def describe_missing(missing):
+    """Message lisible listant les colonnes manquantes de chaque feuille."""
+    return '; '.join(
+        f"feuille « {name} » : colonnes manquantes {', '.join(header_key(c) for c in columns)}"
+        for name, columns in missing.items()
+    )
+
+
+# Plus grande valeur représentée dans les colonnes réduites à 32 bits
+INT32_MAX = np.iinfo('int32').max
+
+
+def _is_text(values):
+    return pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)
+
+
+def _to_number(values):
+    if _is_text(values):
+        # Pourcentages saisis comme texte : '85%', '85,5'
+        values = values.astype(str).str.replace('%', '', regex=False).str.replace(',', '.', regex=False)
+    return pd.to_numeric(values, errors='coerce')
+
+
+def _convert(values, kind):
+    if kind == 'libelle':
+        return values.astype('category') if _is_text(values) else values
+    numbers = _to_number(values)
+    if kind == 'montant':
+        return numbers.astype('float64')
+    # Types réduits seulement si toutes les valeurs y tiennent ; sinon 64 bits
+    fits = not (numbers.abs() > INT32_MAX).any()
+    if kind == 'nombre' and numbers.notna().all() and (numbers % 1 == 0).all():
+        return numbers.astype('int32' if fits else 'int64')
+    return numbers.astype('float32' if fits else 'float64')
+
+
+def normalize_frame(df):
+    """Nettoie les en-têtes et applique les types de ``COLUMN_TYPES`` aux colonnes connues.
+
+    Les en-têtes connus et leurs alias prennent leur nom canonique, les
+    autres perdent leurs espaces de début et de fin ('Grade ') ; les
+    colonnes hors registre gardent leur type.
+    """
+    df = df.rename(columns=canonical_name)
+    for column in df.columns:
+        kind = COLUMN_TYPES.get(column)
+        if kind is not None:
+            df[column] = _convert(df[column], kind)
+    return df
@@ -0,0 +1,118 @@
+import os
+import shutil
+import threading
+import time
+
+from cache import frame_nbytes
+from loader import SheetStats, read_sheets
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow est installé avec streamlit
+    feather = None
+
+# Répertoire des instantanés Arrow/Feather, un fichier par empreinte de feuille
+SNAPSHOT_DIR = os.environ.get('DASHBOARD_SNAPSHOT_DIR', '.snapshots')
+
+# À incrémenter quand le contenu des feuilles lues change (ex. normalisation des types)
+SNAPSHOT_VERSION = 4
+
+# Nombre de feuilles conservées sur disque (les moins récemment utilisées sont supprimées)
+SNAPSHOT_KEEP = int(os.environ.get('DASHBOARD_SNAPSHOT_KEEP', '500'))
+
+
+def _sheet_path(sheet_key):
+    return os.path.join(SNAPSHOT_DIR, f'{sheet_key}-v{SNAPSHOT_VERSION}.feather')
+
+
+def load_snapshots(sheet_keys):
+    """Charge par projection mémoire les feuilles déjà converties.
+
+    ``sheet_keys`` associe chaque feuille à son empreinte (voir
+    ``catalog.sheet_fingerprints``). Les feuilles sans instantané sont
+    simplement absentes du résultat.
+    """
+    frames = {}
+    stats = []
+    if feather is None:
+        return frames, stats
+    for name, key in sheet_keys.items():
+        path = _sheet_path(key)
+        start = time.perf_counter()
+        try:
+            df = feather.read_table(path, memory_map=True).to_pandas()
+            # Marque la feuille comme récemment utilisée pour l'élagage
+            os.utime(path)
+        except FileNotFoundError:
+            # Pas d'instantané, ou supprimé à l'instant par l'élagage d'un autre processus
+            continue
+        frames[name] = df
+        stats.append(SheetStats(name, time.perf_counter() - start, len(df), frame_nbytes(df)))
+    return frames, stats
+
+
+def save_snapshots(sheet_keys, frames):
+    """Écrit chaque feuille lue au format Feather, sous son empreinte."""
+    if feather is None:
+        return
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    for name, df in frames.items():
+        path = _sheet_path(sheet_keys[name])
+        tmp_path = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+        try:
+            feather.write_feather(df, tmp_path, compression='uncompressed')
+        except (TypeError, ValueError, OSError):
+            # Colonnes de types mélangés ou en-têtes non textuels : la feuille
+            # sera relue depuis Excel, ce qui reste correct
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            continue
+        os.replace(tmp_path, path)
+    _prune()
+
+
+def _modified_times(paths):
+    # Les fichiers supprimés entre-temps (élagage concurrent) sont ignorés
+    times = {}
+    for path in paths:
+        try:
+            times[path] = os.path.getmtime(path)
+        except FileNotFoundError:
+            pass
+    return times
+
+
+def _prune():
+    entries = [os.path.join(SNAPSHOT_DIR, name) for name in os.listdir(SNAPSHOT_DIR)]
+    for path in entries:
+        if os.path.isdir(path):
+            # Ancien format : un dossier par classeur
+            shutil.rmtree(path, ignore_errors=True)
+    times = _modified_times(p for p in entries if p.endswith('.feather'))
+    files = sorted(times, key=times.get, reverse=True)
+    for path in files[SNAPSHOT_KEEP:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def read_with_snapshots(source, sheet_keys, reader=read_sheets, on_sheet=None):
+    """Lit les feuilles depuis leurs instantanés, et les autres avec ``reader`` (puis les convertit).
+
+    Seules les feuilles nouvelles ou modifiées depuis un précédent
+    chargement sont relues. ``reader(source, noms, on_sheet=...)`` retourne
+    les feuilles et leurs mesures, comme ``loader.read_sheets`` ;
+    ``on_sheet(nom, df)`` est appelé pour chaque feuille dès qu'elle est prête.
+    """
+    frames, stats = load_snapshots(sheet_keys)
+    if on_sheet is not None:
+        for name, df in frames.items():
+            on_sheet(name, df)
+    to_parse = [name for name in sheet_keys if name not in frames]
+    if to_parse:
+        parsed, parse_stats = reader(source, to_parse, on_sheet=on_sheet)
+        save_snapshots(sheet_keys, parsed)
+        frames.update(parsed)
+        stats += parse_stats
+    return frames, stats
@@ -0,0 +1,48 @@
+import io
+
+import pandas as pd
+
+from kpis import kpi_series, rh_kpis
+from roster import BLANK_LABEL, read_roster_csv, roster_frames
+
+# Cinq agents, dont deux sans catégorie et un sans âge exploitable
+CSV = (
+    "Catégorie;Sexe;Âge;Diplôme\n"
+    "A;Homme;25;Licence\n"
+    "A;Femme;35;Licence\n"
+    "B;Femme;45;\n"
+    ";Homme;61;Master\n"
+    " ;Femme;x;Master\n"
+).encode('utf-8')
+
+
+def _totals(frames):
+    totals = {}
+    for name, df in frames.items():
+        numbers = df.select_dtypes('number')
+        # Feuille large (diplômes) : une colonne par valeur ; sinon la colonne des effectifs
+        totals[name] = numbers.iloc[0].sum() if len(df) == 1 else numbers.iloc[:, 0].sum()
+    return totals
+
+
+def test_blank_dimensions_keep_every_agent():
+    frames, _ = read_roster_csv(io.BytesIO(CSV))
+    assert set(_totals(frames).values()) == {5}
+    grade = frames['Répartition par Grade'].set_index('Catégorie')
+    assert grade.loc[BLANK_LABEL, 'Nombre'] == 2
+    assert grade['Pourcentage %'].sum() == 100
+    age = frames['Répartition par Age']
+    assert age["tranche d'âge"].iloc[-1] == BLANK_LABEL
+
+
+def test_gender_shares_add_up_with_blank_grades():
+    frames, _ = read_roster_csv(io.BytesIO(CSV))
+    table = rh_kpis(frames)
+    assert kpi_series(table, 'RH', 'Effectif total').iloc[0] == 5
+    assert kpi_series(table, 'RH', 'Part par genre (%)').sum() == 100
+
+
+def test_roster_frames_matches_csv():
+    df = pd.read_csv(io.BytesIO(CSV), sep=';', dtype=str, keep_default_na=False)
+    frames, _ = read_roster_csv(io.BytesIO(CSV))
+    assert _totals(roster_frames(df)) == _totals(frames)
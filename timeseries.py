@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+# Colonnes (crédits, engagements, paiements) des feuilles d'exécution budgétaire
+EXECUTION_COLUMNS = {
+    'exploitation': ['Crédits ouverts  (A)', 'Engagements \n(B)', 'Paiements \n(C)'],
+    'investissement': ['Crédits ouverts Hors reports (A)', 'Engagements Hors Reports (B)',
+                       'Paiements Hors Reports (C)'],
+}
+
+# Noms communs de ces colonnes dans les séries
+EXECUTION_MEASURES = ['Crédits ouverts', 'Engagements', 'Paiements']
+RATE_COLUMNS = ["Taux d'engagement (%)", 'Taux de paiement (%)']
+
+
+def stack_years(df, key, columns, names=None):
+    """Sommes par (année, ``key``) : une ligne par couple, une colonne par mesure.
+
+    ``df`` contient toutes les années empilées (voir
+    ``catalog.combine_years``). Les mesures sont converties en float64 et
+    éventuellement renommées avec ``names``.
+    """
+    values = df[columns].apply(pd.to_numeric, errors='coerce').astype('float64')
+    if names is not None:
+        values.columns = names
+    return values.groupby([df['Year'], df[key]], observed=True).sum().sort_index()
+
+
+def add_rates(frame):
+    """Ajoute les taux d'engagement (engagements / crédits) et de paiement (paiements / engagements)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frame[RATE_COLUMNS[0]] = frame['Engagements'] / frame['Crédits ouverts'] * 100
+        frame[RATE_COLUMNS[1]] = frame['Paiements'] / frame['Engagements'] * 100
+    frame[RATE_COLUMNS] = frame[RATE_COLUMNS].replace([np.inf, -np.inf], np.nan)
+    return frame
+
+
+def add_trends(frame, columns, level=None):
+    """Ajoute, pour chaque mesure, l'écart et l'évolution (%) sur l'année précédente et le cumul.
+
+    Avec ``level`` (ex. 'Programme'), les calculs sont faits séparément pour
+    chaque valeur de ce niveau d'index ; l'année précédente est alors la
+    précédente disponible pour cette valeur.
+    """
+    values = frame[columns]
+    grouped = values.groupby(level=level, observed=True) if level else values
+    previous = grouped.shift()
+    cumulative = grouped.cumsum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for column in columns:
+            frame[f'{column} - écart N-1'] = values[column] - previous[column]
+            frame[f'{column} - évolution (%)'] = (values[column] / previous[column] - 1) * 100
+            frame[f'{column} - cumul'] = cumulative[column]
+    return frame.replace([np.inf, -np.inf], np.nan)
+
+
+def year_totals(series, columns):
+    """Totaux par année des mesures d'une série indexée par (année, clé)."""
+    return series[columns].groupby(level='Year').sum()
+
+
+def budget_series(budget_all_years):
+    """Dotation reçue par (année, source), avec écarts, évolutions et cumuls par source."""
+    series = stack_years(budget_all_years, 'Source', ['Dotation reçue'])
+    return add_trends(series, ['Dotation reçue'], level='Source')
+
+
+def execution_series(df, columns):
+    """Crédits, engagements, paiements, taux et tendances par (année, programme).
+
+    ``columns`` donne les colonnes (crédits, engagements, paiements) de la
+    feuille, dans cet ordre.
+    """
+    series = add_rates(stack_years(df, 'Programme', columns, EXECUTION_MEASURES))
+    return add_trends(series, EXECUTION_MEASURES, level='Programme')
+
+
+def execution_totals(series):
+    """Totaux par année d'une série d'exécution, avec taux et tendances calculés sur les totaux."""
+    totals = add_rates(year_totals(series, EXECUTION_MEASURES))
+    return add_trends(totals, EXECUTION_MEASURES)
@@ -0,0 +1,56 @@
+"""Préchauffage d'un processus serveur : imports, lecteur Excel et modèles de figures.
+
+La première lecture d'un classeur et le premier graphique d'un processus
+paient l'import de plotly.express, le chargement d'openpyxl et la
+construction des modèles Plotly. L'application lance ``start_warm_up`` à
+son premier affichage, en arrière-plan, pour que ces coûts soient payés
+pendant que l'utilisateur choisit son fichier.
+
+Pour mesurer le préchauffage seul :
+    python warmup.py
+"""
+import io
+import threading
+import time
+
+import pandas as pd
+
+_started = False
+_lock = threading.Lock()
+
+# Petite feuille au format RH, lue et tracée pour préchauffer toute la chaîne
+SAMPLE_SHEET = 'Répartition par Grade'
+SAMPLE = pd.DataFrame({'Catégorie': ['A', 'B'], 'Nombre': [1, 2], 'Pourcentage %': [33.3, 66.7]})
+
+
+def warm_up():
+    """Importe plotly.express, lit un petit classeur et sérialise une figure de chaque famille.
+
+    Retourne la durée du préchauffage (s).
+    """
+    start = time.perf_counter()
+    import charts
+    from loader import read_sheets
+
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        SAMPLE.to_excel(writer, sheet_name=SAMPLE_SHEET, index=False)
+    sheets, _ = read_sheets(io.BytesIO(buffer.getvalue()), [SAMPLE_SHEET], workers=1)
+    sample = sheets[SAMPLE_SHEET]
+    charts.grade_figure(sample).to_json()
+    charts.yearly_bar_figure(sample.assign(Year=2024), 'Catégorie', ['Nombre'], title="").to_json()
+    return time.perf_counter() - start
+
+
+def start_warm_up():
+    """Lance ``warm_up`` une seule fois par processus, dans un fil d'exécution en arrière-plan."""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+
+if __name__ == '__main__':
+    print(f"Préchauffage : {warm_up():.2f} s")